@@ -0,0 +1,86 @@
+"""
+Checks that lexing and parsing hostile or broken inputs takes time linear
+in the input size.
+
+Each case is a generator of source text of size proportional to n.
+We time it at the first n, doubling from SMALL_N, at which it takes at
+least MIN_SECONDS, so that timer noise is small beside it, and at SCALE
+times that n, and fail if time grows much faster than n does.
+
+    python adversarial_bench.py
+"""
+
+import sys
+import unittest
+
+from bench import best_time
+from lex import lex, preparse
+from parse import parse
+
+SMALL_N = 2000
+MIN_SECONDS = 0.02
+SCALE = 8
+# Linear growth gives a ratio of about SCALE and quadratic of SCALE ** 2.
+# Leave plenty of headroom for timer noise and GC.
+MAX_RATIO = SCALE * 2.5
+REPEATS = 3
+
+CASES = {
+    # Lexer
+    'unterminated_triple_quote': lambda n: 'x = """' + 'a\n' * n,
+    'unterminated_single_quotes': lambda n: '"\\\n' * n,
+    'many_quotes': lambda n: "'" * n,
+    'triple_quote_runs': lambda n: "'''" + "''x" * n,
+    'line_continuations': lambda n: '\\\n' * n,
+    'unclosed_bracket_lines': lambda n: '(\n' * n,
+    'unclosed_bracket_keywords': lambda n: '(' + '\n if x' * n,
+    # Deep operator stacks
+    'unclosed_brackets': lambda n: '(' * n,
+    'mismatched_close_brackets': lambda n: '[' * n + ')' * n,
+    'nested_lists': lambda n: '[' * n + ']' * n,
+    'prefix_chain': lambda n: 'not ' * n + 'x',
+    'right_assoc_chain': lambda n: 'x' + ' = x' * n,
+    'long_tuple': lambda n: '(' + 'a, ' * n + ')',
+    'conditional_chain': lambda n: 'x' + ' if c else x' * n,
+    'followers_over_prefix_chain': lambda n: 'not ' * n + 'x' + ' in x' * n,
+    'else_over_prefix_chain': lambda n: 'not ' * n + 'x' + ' else x' * n,
+    # Wide nodes
+    'long_block': lambda n: 'def f():\n' + '    x = 1\n' * n,
+    'long_call_chain': lambda n: 'f' + '(x)' * n,
+}
+
+
+def time_case(make_source, n):
+    source_text = make_source(n)
+    return best_time(
+        lambda: parse(preparse(lex(source_text))), REPEATS)
+
+
+def calibrate(make_source):
+    """
+    The first n, doubling from SMALL_N, at which make_source takes at
+    least MIN_SECONDS, and the time it takes.
+    """
+    n = SMALL_N
+    while True:
+        elapsed = time_case(make_source, n)
+        if elapsed >= MIN_SECONDS:
+            return n, elapsed
+        n *= 2
+
+
+class AdversarialBench(unittest.TestCase):
+    def test_linear(self):
+        for name, make_source in CASES.items():
+            with self.subTest(name):
+                n, small = calibrate(make_source)
+                large = time_case(make_source, n * SCALE)
+                ratio = large / small
+                sys.stderr.write(
+                    '%-30s n=%-7d %8.4fs  n=%-7d %8.4fs  ratio %5.1f\n' % (
+                        name, n, small, n * SCALE, large, ratio))
+                self.assertLess(ratio, MAX_RATIO)
+
+
+if __name__ == '__main__':
+    unittest.main()
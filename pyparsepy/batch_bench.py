@@ -0,0 +1,37 @@
+"""
+Compares calls per second for parse_batch with looping over
+parse(preparse(lex(source_text))) on tiny snippets.
+
+    python batch_bench.py
+"""
+
+from bench import best_time
+from lex import lex, preparse
+from parse import parse, parse_batch
+
+SNIPPETS = [
+    'x + 1',
+    'f(a, b)',
+    'print("hi")',
+    'a[0]',
+    'x = [i for i in y]',
+    'import os',
+    'def f(x): return x',
+    'not a or b',
+] * 2000
+REPEATS = 5
+
+
+def main():
+    loop_time = best_time(
+        lambda: [parse(preparse(lex(s))) for s in SNIPPETS], REPEATS)
+    batch_time = best_time(lambda: parse_batch(SNIPPETS), REPEATS)
+    n = len(SNIPPETS)
+    print('%d snippets' % n)
+    print('loop         %8.0f calls/s' % (n / loop_time))
+    print('parse_batch  %8.0f calls/s  speedup %.2f' % (
+        n / batch_time, loop_time / batch_time))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,24 @@
+"""
+Timing helpers for the *_bench.py scripts.
+"""
+
+import time
+
+def timed(f):
+    """
+    The seconds that calling f takes, and its result.
+    """
+    start = time.perf_counter()
+    result = f()
+    return time.perf_counter() - start, result
+
+def best_time(f, repeats=3):
+    """
+    The fewest seconds that calling f takes over repeats calls, which is
+    the least disturbed by other work on the machine.
+    """
+    best = None
+    for _ in range(repeats):
+        elapsed, _ = timed(f)
+        best = elapsed if best is None else min(best, elapsed)
+    return best
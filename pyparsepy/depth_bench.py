@@ -0,0 +1,61 @@
+"""
+Checks that the cost per token of parsing deeply nested code does not
+grow with the nesting depth.
+
+Each case is a generator of source text nested n levels deep.  We time
+it at depths from 1k to 10k and fail if the time per token at the
+deepest is much more than at the shallowest.
+
+    python depth_bench.py
+"""
+
+import sys
+import unittest
+
+from bench import best_time
+from lex import lex, preparse
+from parse import parse
+
+DEPTHS = (1000, 2000, 5000, 10000)
+# Constant cost per token gives a ratio of about 1, and cost linear in
+# depth a ratio of about DEPTHS[-1] / DEPTHS[0].
+MAX_RATIO = 2.5
+REPEATS = 3
+
+CASES = {
+    'lists': lambda n: '[a, ' * n + ']' * n,
+    'calls': lambda n: 'f(x, ' * n + ')' * n,
+    'subscripts': lambda n: 'a[' * n + '0' + ']' * n,
+    'dicts': lambda n: '{k: ' * n + 'v' + '}' * n,
+    'blocks': lambda n: ''.join(
+        '    ' * i + 'if x:\n' for i in range(n)) + '    ' * n + 'pass\n',
+    'conditionals': lambda n: '(a if b else ' * n + 'c' + ')' * n,
+    'comparisons': lambda n: '(a < b and ' * n + 'c' + ')' * n,
+    'prefix_and_infix': lambda n: '(not -x + ' * n + 'y' + ')' * n,
+    'lambdas': lambda n: 'lambda: ' * n + 'x',
+    'operators_over_prefix_chain': lambda n: 'not ' * n + 'x' + ' + x' * n,
+    'items_in_deep_brackets': lambda n: '[' * n + 'a, ' * n + ']' * n,
+}
+
+
+def time_per_token(make_source, n):
+    tokens = list(preparse(lex(make_source(n))))
+    return best_time(lambda: parse(tokens), REPEATS) / len(tokens)
+
+
+class DepthBench(unittest.TestCase):
+    def test_depth_independent(self):
+        for name, make_source in CASES.items():
+            with self.subTest(name):
+                times = [time_per_token(make_source, n) for n in DEPTHS]
+                ratio = times[-1] / max(times[0], 1e-9)
+                sys.stderr.write('%-30s %s  ratio %4.1f\n' % (
+                    name,
+                    '  '.join('n=%-5d %5.2fus' % (n, t * 1e6)
+                              for (n, t) in zip(DEPTHS, times)),
+                    ratio))
+                self.assertLess(ratio, MAX_RATIO)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,128 @@
+"""
+Renders parse trees as HTML in the markup that formatTNode in
+homoiconicity.html uses: a <span class="tnode"> per InnerNode holding its
+children separated by ', ', and a <span class="tleaf"> per Token.
+
+    python htmltree.py [--max-depth N] [--max-nodes N] < file.py > file.html
+"""
+
+from lex import Token
+
+# As escHtml in html.js.
+HTML_ESCAPES = {ord(c): '&#%d;' % ord(c) for c in '&<>"\''}
+
+# The rules for trees from homoiconicity.html, which links common.css for
+# the rest, and one for subtrees left out.
+TREE_STYLE = '''\
+  .tleaf { font-family: "Inconsolata", "Consolas", "Lucida Console", "Monaco", monospace }
+  .tleaf:before, .tleaf:after {
+      font-family: "Noto Sans", "Lucida Grande", "Lucida Sans", "Segoe UI", "Verdana", sans-serif;
+  }
+  .tree { white-space: pre-wrap }
+  .tnode { display:inline-block; border: 1px solid green; margin: 2px }
+  .tleaf:before { content: "\\201c" }
+  .tleaf:after { content: "\\201d" }
+  .tnode.collapsed { border-style: dashed; color: #888 }
+'''
+
+def esc_html(text):
+    return text.translate(HTML_ESCAPES)
+
+def write_html(tree, out, max_depth=None, max_nodes=None):
+    """
+    Writes tree to the file-like out as nested tnode and tleaf spans, a
+    piece at a time, without recursing.
+
+    max_depth:
+      If given, InnerNodes nested inside more than this many others are
+      shown collapsed.
+    max_nodes:
+      If given, once this many nodes have been written, the children not
+      yet written of each open InnerNode are shown as one collapsed span.
+
+    A collapsed span is a tnode span with the class collapsed, whose title
+    is the left and right of what it stands for.  Its children are never
+    looked at, so collapsed indented blocks from parse with lazy_blocks
+    are not parsed, and the output and time are bounded by the options
+    rather than the size of tree.
+    """
+    if isinstance(tree, Token):
+        write_leaf(tree, out)
+        return
+    if max_depth is not None and max_depth < 1 \
+            or max_nodes is not None and max_nodes < 1:
+        write_collapsed(tree.left, tree.right, out)
+        return
+    out.write('<span class="tnode">')
+    n_nodes = 1
+    # Pairs (children, index of the next to write) for open tnode spans.
+    stack = [(tree.children, 0)]
+    while stack:
+        children, i = stack[-1]
+        if i == len(children):
+            stack.pop()
+            out.write('</span>')
+            continue
+        if i:
+            out.write(', ')
+        if max_nodes is not None and n_nodes >= max_nodes:
+            write_collapsed(children[i].left, children[-1].right, out)
+            stack[-1] = (children, len(children))
+            continue
+        child = children[i]
+        stack[-1] = (children, i + 1)
+        n_nodes += 1
+        if isinstance(child, Token):
+            write_leaf(child, out)
+        elif max_depth is not None and len(stack) >= max_depth:
+            write_collapsed(child.left, child.right, out)
+        else:
+            out.write('<span class="tnode">')
+            stack.append((child.children, 0))
+
+def write_leaf(token, out):
+    out.write('<span class="tleaf">%s</span>' % esc_html(token.tok))
+
+def write_collapsed(left, right, out):
+    out.write(
+        '<span class="tnode collapsed" title="%d-%d">…</span>' % (
+            left, right))
+
+def write_document(tree, out, title='Parse tree', stylesheet='common.css',
+                   **options):
+    """
+    Writes an HTML document showing tree, as by write_html with options,
+    that links stylesheet.
+    """
+    out.write(
+        '<!doctype html>\n'
+        '<html lang="en">\n'
+        '<meta charset="utf-8">\n'
+        '<title>%s</title>\n'
+        '<link rel="stylesheet" href="%s" />\n'
+        '<style>\n%s</style>\n'
+        '<div class="tree">' % (
+            esc_html(title), esc_html(stylesheet), TREE_STYLE))
+    write_html(tree, out, **options)
+    out.write('</div>\n')
+
+
+if __name__ == '__main__':
+    import argparse
+    import sys
+    from lex import lex, preparse
+    from parse import parse
+
+    def main():
+        argparser = argparse.ArgumentParser(
+            description='Renders a Python source text on stdin as HTML.')
+        argparser.add_argument('--max-depth', type=int)
+        argparser.add_argument('--max-nodes', type=int)
+        argparser.add_argument('--title', default='Parse tree')
+        args = argparser.parse_args()
+        # Collapsed blocks are never parsed.
+        tree = parse(preparse(lex(sys.stdin.read())), lazy_blocks=True)
+        write_document(
+            tree, sys.stdout, title=args.title,
+            max_depth=args.max_depth, max_nodes=args.max_nodes)
+    main()
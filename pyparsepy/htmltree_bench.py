@@ -0,0 +1,50 @@
+"""
+Times rendering a large source text as HTML with write_html, in full and
+with its depth and node caps, counting the output instead of keeping it.
+
+    python htmltree_bench.py [megabytes]
+"""
+
+import sys
+
+from bench import timed
+from lex import lex, preparse
+from parse import parse
+from parallel_bench import corpus
+from htmltree import write_html
+
+OPTIONS = (
+    {},
+    {'max_depth': 8},
+    {'max_depth': 3},
+    {'max_nodes': 10000},
+)
+
+
+class CountingWriter:
+    def __init__(self):
+        self.n_chars = 0
+
+    def write(self, text):
+        self.n_chars += len(text)
+
+
+def main(megabytes):
+    source_text = corpus(int(megabytes * (1 << 20)))
+    tokens = list(preparse(lex(source_text)))
+    print('%d chars, %d tokens' % (len(source_text), len(tokens)))
+    for options in OPTIONS:
+        def parse_and_render():
+            # A new tree each time, so that collapsed blocks stay unparsed.
+            tree = parse(tokens, lazy_blocks=True)
+            out = CountingWriter()
+            write_html(tree, out, **options)
+            return out
+        elapsed, out = timed(parse_and_render)
+        print('%-20s parse and render %6.2fs  %10d chars of HTML' % (
+            ', '.join('%s=%d' % item for item in options.items()) or 'full',
+            elapsed, out.n_chars))
+
+
+if __name__ == '__main__':
+    main(float(sys.argv[1]) if len(sys.argv) > 1 else 2)
@@ -0,0 +1,101 @@
+import io
+import json
+import unittest
+
+from lex import Token, lex, preparse
+from parse import LazyBlockNode, parse
+from parse_test import ParseTreeEncoder
+from htmltree import esc_html, write_document, write_html
+
+SOURCES = (
+    '',
+    'pass',
+    'if a < b:\n\tf(x, "&\'")\nelse:\n\tpass\n',
+    'x = lambda: (yield)\n',
+)
+
+def format_tnode(parse_tree):
+    """
+    formatTNode from homoiconicity.html, applied to the JSON for a tree.
+    """
+    if isinstance(parse_tree, list):
+        return '<span class="tnode">%s</span>' % ', '.join(
+            map(format_tnode, parse_tree))
+    return '<span class="tleaf">%s</span>' % esc_html(parse_tree)
+
+def parse_source(source_text, lazy_blocks=False):
+    return parse(preparse(lex(source_text)), lazy_blocks=lazy_blocks)
+
+def render(tree, **options):
+    out = io.StringIO()
+    write_html(tree, out, **options)
+    return out.getvalue()
+
+class WriteHtmlTest(unittest.TestCase):
+    def test_same_as_format_tnode(self):
+        for source_text in SOURCES:
+            with self.subTest(source_text):
+                tree = parse_source(source_text)
+                want = format_tnode(json.loads(
+                    json.dumps(tree, cls=ParseTreeEncoder)))
+                self.assertEqual(want, render(tree))
+                self.assertEqual(
+                    want, render(tree, max_depth=1000, max_nodes=1000))
+
+    def test_escaping(self):
+        self.assertEqual(
+            '<span class="tleaf">&#60;&#38;&#62;&#34;&#39;</span>',
+            render(Token('<&>"\'', 0, 5)))
+
+    def test_max_depth(self):
+        tree = parse_source('f(x)')
+        self.assertEqual(
+            '<span class="tnode">'
+            '<span class="tnode collapsed" title="0-4">…</span>, '
+            '<span class="tleaf">\n</span>'
+            '</span>',
+            render(tree, max_depth=1))
+        self.assertEqual(
+            '<span class="tnode collapsed" title="0-4">…</span>',
+            render(tree, max_depth=0))
+
+    def test_max_nodes(self):
+        tree = parse_source('a\nb\nc\nd\n')
+        self.assertEqual(4, len(tree.children))
+        self.assertEqual(
+            '<span class="tnode">'
+            '<span class="tnode"><span class="tnode">'
+            '<span class="tleaf">a</span>'
+            '</span>, '
+            '<span class="tnode collapsed" title="0-1">…</span></span>, '
+            '<span class="tnode collapsed" title="1-4">…</span>'
+            '</span>',
+            render(tree, max_nodes=4))
+
+    def test_collapsed_blocks_not_parsed(self):
+        tree = parse_source(
+            'class C:\n  def f():\n    return 1\n', lazy_blocks=True)
+        render(tree, max_depth=1)
+        (inner,) = [child for child in tree.children
+                    if isinstance(child, LazyBlockNode)]
+        self.assertFalse(inner.is_parsed())
+        render(tree)
+        self.assertTrue(inner.is_parsed())
+
+    def test_deep(self):
+        tree = parse_source('(' * 100000 + 'x' + ')' * 100000)
+        html = render(tree, max_depth=10)
+        self.assertEqual(10, html.count('<span class="tnode">'))
+        self.assertGreater(len(render(tree)), 100000 * 20)
+
+    def test_document(self):
+        out = io.StringIO()
+        write_document(parse_source('x'), out, title='<x>')
+        html = out.getvalue()
+        self.assertIn('<title>&#60;x&#62;</title>', html)
+        self.assertIn('<link rel="stylesheet" href="common.css" />', html)
+        self.assertTrue(html.endswith(
+            '<div class="tree">%s</div>\n' % render(parse_source('x'))))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,88 @@
+"""
+Measures the cost of importing lex, ops and parse, and of first use, in
+fresh interpreters, like `python -X importtime`.
+
+    python import_bench.py
+"""
+
+import os
+import subprocess
+import sys
+import unittest
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+MODULES = ('lex', 'ops', 'parse')
+RUNS = 7
+
+FIRST_USE = (
+    'from lex import lex, preparse; from parse import parse; '
+    'parse(preparse(lex("x = 1")))'
+)
+
+
+def import_times(statement):
+    """
+    Maps module names to (self, cumulative) import microseconds for
+    statement, per -X importtime.
+    """
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', statement],
+        cwd=HERE, capture_output=True, text=True, check=True)
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        fields = line[len('import time:'):].split('|')
+        if len(fields) != 3 or not fields[1].strip().isdigit():
+            continue
+        times[fields[2].strip()] = (int(fields[0]), int(fields[1]))
+    return times
+
+
+def wall_time_us(statement):
+    """
+    Microseconds to run statement after interpreter startup.
+    """
+    timed = (
+        'import time; t = time.perf_counter(); %s; '
+        'print(int((time.perf_counter() - t) * 1e6))'
+    ) % statement
+    result = subprocess.run(
+        [sys.executable, '-c', timed],
+        cwd=HERE, capture_output=True, text=True, check=True)
+    return int(result.stdout)
+
+
+def median(values):
+    values = sorted(values)
+    return values[len(values) // 2]
+
+
+class ImportBench(unittest.TestCase):
+    def test_import_time(self):
+        for module in MODULES:
+            with self.subTest(module):
+                runs = [import_times('import %s' % module)[module]
+                        for _ in range(RUNS)]
+                sys.stderr.write(
+                    'import %-6s %8d us self %8d us cumulative\n' % (
+                        module,
+                        median(self_us for (self_us, _) in runs),
+                        median(cumulative for (_, cumulative) in runs)))
+
+    def test_import_is_lazy(self):
+        # Compiling the token patterns is most of the cost of importing
+        # lex, so importing should leave that to first use.
+        result = subprocess.run(
+            [sys.executable, '-c',
+             'import parse, lex; print(sorted(lex.COMPILED_PATTERNS))'],
+            cwd=HERE, capture_output=True, text=True, check=True)
+        self.assertEqual('[]', result.stdout.strip())
+
+    def test_first_use(self):
+        elapsed = median(wall_time_us(FIRST_USE) for _ in range(RUNS))
+        sys.stderr.write('import and parse one line %8d us\n' % elapsed)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,44 @@
+"""
+Compares the time to parse modules fully with the time to parse only
+their top-level structure, leaving block bodies unparsed.
+
+    python lazy_bench.py [file.py ...]
+
+With no files, uses this package's own modules.
+"""
+
+import glob
+import os
+import sys
+
+from bench import best_time
+from lex import lex, preparse
+from parse import parse
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+REPEATS = 5
+
+
+def main(paths):
+    totals = [0, 0, 0]
+    for path in paths or sorted(glob.glob(os.path.join(HERE, '*.py'))):
+        with open(path, encoding='utf-8') as inp:
+            source_text = inp.read()
+        lex_time = best_time(lambda: list(preparse(lex(source_text))), REPEATS)
+        tokens = list(preparse(lex(source_text)))
+        eager_time = best_time(lambda: parse(tokens), REPEATS)
+        lazy_time = best_time(lambda: parse(tokens, lazy_blocks=True), REPEATS)
+        print('%-24s %6d tokens  parse %.4fs  lazy %.4fs  speedup %5.1f' % (
+            os.path.basename(path), len(tokens), eager_time, lazy_time,
+            eager_time / lazy_time))
+        totals[0] += lex_time
+        totals[1] += eager_time
+        totals[2] += lazy_time
+    lex_time, eager_time, lazy_time = totals
+    print('total: parse speedup %.1f, with lexing %.1f' % (
+        eager_time / lazy_time,
+        (lex_time + eager_time) / (lex_time + lazy_time)))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -1,8 +1,24 @@
 """
 A lexer for Python.
+
+Complexity: logical_lines, lex and preparse run in time and space linear
+in the length of the source text, including on broken input like an
+unterminated string or an unclosed bracket.  The regexes below never
+backtrack over more than one alternative: EXPLICIT_LINE_PATTERN and
+TOKEN_PATTERN can match any non-empty prefix of their input, so no
+match attempt fails after consuming input, and the alternatives of
+STRING each consume only characters their siblings reject.
+adversarial_bench.py checks these bounds.
+
+Thread safety: lex, logical_lines and preparse keep their state in
+locals, and the only shared mutable state, COMPILED_PATTERNS, is filled
+under a lock, so they may run concurrently, including on free-threaded
+builds.  A PhysicalLineMemo must not be shared between threads.
 """
 
+from collections import OrderedDict
 import re
+import _thread
 
 ## Lexical definitions
 ## per https://docs.python.org/3/reference/lexical_analysis.html
@@ -57,59 +73,202 @@ PUNCTUATION = r'(?:%s)' % '|'.join(
     [re.escape(x) for x in PUNCTUATORS]
 )
 
+# Alternatives that match where an earlier alternative in TOKEN_PATTERN's
+# natural order (whitespace, breaks, COMMENT, STRING, WORD, NUMBER,
+# PUNCTUATION) cannot, so they can be tried first.
+# A WORD that is not a STRING_PREFIX followed by a quote.
+PLAIN_WORD = r'[A-Za-z_](?<![bBfFrRuU])%s*' % (ID_CONTINUE,)
+# PUNCTUATION that does not start like a NUMBER.
+PLAIN_PUNCTUATION = r'(?:%s)' % '|'.join(
+    [re.escape(x) for x in PUNCTUATORS if x[0] != '.']
+)
+
 BREAKING_WHITESPACE = r'(?:\n|\r\n?)'
 NON_BREAKING_WHITESPACE = r'(?:[\t\x0c\x20]|\\%s)+' % (BREAKING_WHITESPACE,)
 
 BREAKS = ('\n', '\r', '\r\n')
 
-EXPLICIT_LINE_PATTERN = re.compile(
-    r'(?:%s)+%s?|%s' % (
-        '|'.join((
-            r'[^\"\'#\r\n\\]',
-            STRING,
+# Compiling these patterns dominates the cost of importing this module,
+# so they are compiled on first use; see compiled_pattern.
+PATTERN_DEFINITIONS = {
+    'EXPLICIT_LINE_PATTERN': (
+        r'(?:%s)+%s?|%s' % (
+            '|'.join((
+                r'[^\"\'#\r\n\\]',
+                STRING,
+                COMMENT,
+                r'[\\]%s?' % BREAKING_WHITESPACE,
+            )),
+            BREAKING_WHITESPACE,
+            BREAKING_WHITESPACE,
+        ),
+        re.DOTALL
+    ),
+    'INDENTING_WHITESPACE_PATTERN': (r'^[\t\x20]+', 0),
+    'TOKEN_PATTERN': (
+        '(?:%s)' % '|'.join((
+            # re tries alternatives in order at each position, so the
+            # commonest tokens come first, guarded by their first
+            # character so that the partition is as if they came last.
+            PLAIN_WORD,
+            NON_BREAKING_WHITESPACE,
+            PLAIN_PUNCTUATION,
+            BREAKING_WHITESPACE,
             COMMENT,
-            r'[\\]%s?' % BREAKING_WHITESPACE,
+            STRING,
+            WORD,
+            NUMBER,
+            PUNCTUATION,
+            # Ensure that tokenization is a true partition of input.
+            # TODO: what does '.' do for orphaned surrogates?
+            r'.',
         )),
-        BREAKING_WHITESPACE,
-        BREAKING_WHITESPACE,
+        re.DOTALL
     ),
-    re.DOTALL
-)
+    # Tokens that are identifiers or keywords.
+    'WORD_PATTERN': (WORD, 0),
+    # TOKEN_PATTERN for text without quotes, '#' or '\\', where the
+    # dropped alternatives cannot match.  See prescan.py.
+    'PLAIN_TOKEN_PATTERN': (
+        '(?:%s)' % '|'.join((
+            WORD,
+            r'[\t\x0c\x20]+',
+            PLAIN_PUNCTUATION,
+            BREAKING_WHITESPACE,
+            NUMBER,
+            PUNCTUATION,
+            r'.',
+        )),
+        re.DOTALL
+    ),
+}
 
-INDENTING_WHITESPACE_PATTERN = re.compile(r'^[\t\x20]+')
-
-TOKEN_PATTERN = re.compile(
-    '(?:%s)' % '|'.join((
-        NON_BREAKING_WHITESPACE,
-        BREAKING_WHITESPACE,
-        COMMENT,
-        STRING,
-        WORD,
-        NUMBER,
-        PUNCTUATION,
-        # Ensure that tokenization is a true partition of input.
-        # TODO: what does '.' do for orphaned surrogates?
-        r'.',
-    )),
-    re.DOTALL
-)
+COMPILED_PATTERNS = {}
+COMPILED_PATTERNS_LOCK = _thread.allocate_lock()
+
+def compiled_pattern(name):
+    """
+    The compiled form of PATTERN_DEFINITIONS[name], compiled on first use.
+    """
+    pattern = COMPILED_PATTERNS.get(name)
+    if pattern is None:
+        with COMPILED_PATTERNS_LOCK:
+            pattern = COMPILED_PATTERNS.get(name)
+            if pattern is None:
+                pattern = re.compile(*PATTERN_DEFINITIONS[name])
+                COMPILED_PATTERNS[name] = pattern
+    return pattern
+
+def __getattr__(name):
+    """
+    Exposes the compiled patterns as module attributes, like
+    lex.TOKEN_PATTERN, without compiling them at import time.
+    """
+    if name in PATTERN_DEFINITIONS:
+        return compiled_pattern(name)
+    raise AttributeError('module %r has no attribute %r' % (__name__, name))
 
-def logical_lines(source_text):
+def logical_lines(source_text, memo=None):
     """
     A series of logical lines for a Python source text.
 
     source_text:
       Assumes bytes already decoded per any encoding declaration.
+    memo:
+      An optional PhysicalLineMemo.
 
     Logical lines are already partitioned into tokens.
     """
+    return join_physical_lines(physical_lines(source_text, memo))
+
+def physical_lines(source_text, memo=None):
+    """
+    A series of physical lines for a Python source text, each as a pair
+    (tokens, bracket_change) where bracket_change is None.
+    See join_physical_lines.
+
+    Lines joined by a backslash, or by a string or comment that spans a
+    line break, count as one physical line here.
+
+    memo:
+      An optional PhysicalLineMemo.  Physical lines include whole strings
+      and comments, so how one splits into tokens never depends on the
+      text around it.
+    """
+    explicit_line_pattern = compiled_pattern('EXPLICIT_LINE_PATTERN')
+    token_pattern = compiled_pattern('TOKEN_PATTERN')
+
+    if memo is None:
+        for match in explicit_line_pattern.finditer(source_text):
+            yield token_pattern.findall(match.group(0)), None
+    else:
+        for match in explicit_line_pattern.finditer(source_text):
+            yield memo.tokens(match.group(0)), None
+
+class PhysicalLineMemo:
+    """
+    A bounded LRU cache from the text of a physical line to its tokens.
+
+    Many physical lines repeat exactly, like 'pass', 'else:' and closing
+    brackets.  hits, misses and bypassed count lookups so that callers
+    can tell whether the memo pays for itself on a corpus.
+    """
+
+    def __init__(self, max_size=4096, max_line_length=120):
+        self.max_size = max_size
+        # Longer lines rarely repeat, and would evict ones that do.
+        self.max_line_length = max_line_length
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.bypassed = 0
+
+    def tokens(self, phys_line):
+        """
+        The token texts of phys_line, as a tuple.
+        """
+        entries = self.entries
+        tokens = entries.get(phys_line)
+        if tokens is not None:
+            self.hits += 1
+            entries.move_to_end(phys_line)
+            return tokens
+        tokens = tuple(compiled_pattern('TOKEN_PATTERN').findall(phys_line))
+        if len(phys_line) > self.max_line_length:
+            self.bypassed += 1
+            return tokens
+        self.misses += 1
+        entries[phys_line] = tokens
+        if len(entries) > self.max_size:
+            entries.popitem(last=False)
+        return tokens
+
+    def hit_rate(self):
+        """
+        The fraction of lookups answered from the memo.
+        """
+        lookups = self.hits + self.misses + self.bypassed
+        return self.hits / lookups if lookups else 0.0
+
+    def __repr__(self):
+        return 'PhysicalLineMemo(%d/%d entries, %d hits, %d misses, %d bypassed)' % (
+            len(self.entries), self.max_size,
+            self.hits, self.misses, self.bypassed)
+
+def join_physical_lines(phys_lines):
+    """
+    Groups physical lines into logical lines.
+
+    phys_lines:
+      Pairs (tokens, bracket_change) as from physical_lines.
+      bracket_change is None, or (net, low) when already known: the net
+      change in bracket depth over tokens, and the lowest it dips below
+      its starting value, or 0.
+    """
 
     open_bracket_count = 0
     logical_line = []
-    for match in EXPLICIT_LINE_PATTERN.finditer(source_text):
-        phys_line = match.group(0)
-        tokens = TOKEN_PATTERN.findall(phys_line)
-
+    for (tokens, bracket_change) in phys_lines:
         # DIFFERENCE FROM SPEC
         if open_bracket_count:
             # For error recovery, reset bracket count
@@ -124,13 +283,13 @@ def logical_lines(source_text):
                 elif tok[0] not in (' ', '\t'):
                     break
 
-        for tok in tokens:
-            if tok in ('(', '[', '{'):
-                open_bracket_count += 1
-            elif tok in ('}', ']', ')'):
-                open_bracket_count = max(
-                    0,
-                    open_bracket_count - 1)
+        if bracket_change is None:
+            open_bracket_count = bracket_depth_after(
+                tokens, open_bracket_count)
+        else:
+            # Same as bracket_depth_after, which stops at zero.
+            net, low = bracket_change
+            open_bracket_count += net - min(0, open_bracket_count + low)
 
         logical_line.extend(tokens)
         if not open_bracket_count:
@@ -141,6 +300,18 @@ def logical_lines(source_text):
     if logical_line:
         yield logical_line
 
+def bracket_depth_after(tokens, depth=0):
+    """
+    The count of open brackets left unclosed after the token texts, given
+    depth open before them.  Close brackets without an open are ignored.
+    """
+    for tok in tokens:
+        if tok in ('(', '[', '{'):
+            depth += 1
+        elif tok in ('}', ']', ')'):
+            depth = max(0, depth - 1)
+    return depth
+
 class Token:
     """
     A source text token and metadata
@@ -187,71 +358,116 @@ def is_code_token(text):
     char0 = text[0]
     return char0 != '#' and char0 > ' ' and char0 != '\\'
 
-def lex(source_text):
+def lex(source_text, memo=None):
     """
     Tokenizes a Python source text.
 
     source_text:
       Assumes bytes already decoded per any encoding declaration.
+    memo:
+      An optional PhysicalLineMemo.
     """
+    return lex_logical_lines(logical_lines(source_text, memo))
 
-    indent_stack = [('', 0)]  # text, value
-    char_pos = 0
+# Tokens per list for the batched pipeline, which hands tokens between
+# stages in lists to save resuming a generator per token.  lex and
+# preparse share its code but yield Tokens a logical line at a time, so
+# that they stream with little memory.
+BATCH_SIZE = 1024
 
-    for logical_line in logical_lines(source_text):
-        num_tokens = len(logical_line)
-        assert num_tokens
-        bracket_depth = 0
-
-        # If there are no code tokens, we don't push indent/dedent tokens.
-        has_code_token = False
-        for i in range(num_tokens - 1, -1, -1):
-            if is_code_token(logical_line[i]):
-                has_code_token = True
-                break
-
-        # Indent/dedent as appropriate
-        if has_code_token:
-            indentation = INDENTING_WHITESPACE_PATTERN.search(logical_line[0])
-            indentation = indentation.group(0) if indentation else ''
-            value = indentation_value(indentation)
-            (_, top_value) = indent_stack[-1]
-            if top_value < value:
-                indent_stack.append((indentation, value))
-                yield Token(Token.INDENT_TEXT, char_pos, char_pos, True)
-            else:
-                # TODO: if same, check whether IndentError needed
-                while top_value > value:
-                    indent_stack[-1:] = []
-                    yield Token(Token.DEDENT_TEXT, char_pos, char_pos, True)
-                    (_, top_value) = indent_stack[-1]
-
-        # Wrap string as tokens
-        for i in range(0, num_tokens):
-            text = logical_line[i]
-            if not is_code_token(text):
-                continue
-            right = char_pos + len(text)
-            yield Token(text, char_pos, right)
-            char_pos = right
-            # but in keyword
-            if text in ('(', '[', '{'):
-                bracket_depth += 1
-            elif text in ('}', ']', ')'):
-                bracket_depth = max(0, bracket_depth - 1)
-
-        # Emit line breaks that separate logical lines.
-        # This allows interpreting '\n' as a statement separator.
-        if has_code_token:
-            left = char_pos
-            if text in BREAKS:
-                left = char_pos - len(text)
-            yield Token('\n', left, char_pos)
+def lex_batches(source_text, memo=None, batch_size=BATCH_SIZE):
+    """
+    Tokenizes a Python source text like lex, but produces lists of about
+    batch_size Tokens.  See preparse_batches.
+    """
+    return lex_logical_line_batches(
+        logical_lines(source_text, memo), batch_size)
 
+def lex_logical_lines(lines):
+    """
+    Tokenizes a series of logical lines as produced by logical_lines.
+    """
+    indent_stack = [('', 0)]  # text, value
+    char_pos = 0
+    for logical_line in lines:
+        tokens = []
+        char_pos = lex_logical_line(
+            logical_line, indent_stack, char_pos, tokens)
+        yield from tokens
     for (_, indent_value) in indent_stack:
         if indent_value:
             yield Token(Token.DEDENT_TEXT, char_pos, char_pos, True)
 
+def lex_logical_line_batches(lines, batch_size=BATCH_SIZE):
+    """
+    Tokenizes a series of logical lines like lex_logical_lines, but
+    produces lists of Tokens, each ending at the end of a logical line
+    once it holds at least batch_size.
+    """
+    indent_stack = [('', 0)]  # text, value
+    char_pos = 0
+    batch = []
+    for logical_line in lines:
+        char_pos = lex_logical_line(
+            logical_line, indent_stack, char_pos, batch)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    for (_, indent_value) in indent_stack:
+        if indent_value:
+            batch.append(Token(Token.DEDENT_TEXT, char_pos, char_pos, True))
+    if batch:
+        yield batch
+
+def lex_logical_line(logical_line, indent_stack, char_pos, out):
+    """
+    Appends to out the Tokens for a logical line that starts at char_pos,
+    pushing and popping indent_stack, and returns the position after it.
+    """
+    append = out.append
+    num_tokens = len(logical_line)
+    assert num_tokens
+
+    # If there are no code tokens, we don't push indent/dedent tokens.
+    has_code_token = False
+    for i in range(num_tokens - 1, -1, -1):
+        if is_code_token(logical_line[i]):
+            has_code_token = True
+            break
+
+    # Indent/dedent as appropriate
+    if has_code_token:
+        indentation = compiled_pattern('INDENTING_WHITESPACE_PATTERN').search(
+            logical_line[0])
+        indentation = indentation.group(0) if indentation else ''
+        value = indentation_value(indentation)
+        (_, top_value) = indent_stack[-1]
+        if top_value < value:
+            indent_stack.append((indentation, value))
+            append(Token(Token.INDENT_TEXT, char_pos, char_pos, True))
+        else:
+            # TODO: if same, check whether IndentError needed
+            while top_value > value:
+                indent_stack[-1:] = []
+                append(Token(Token.DEDENT_TEXT, char_pos, char_pos, True))
+                (_, top_value) = indent_stack[-1]
+
+    # Wrap string as tokens
+    for text in logical_line:
+        if not is_code_token(text):
+            continue
+        right = char_pos + len(text)
+        append(Token(text, char_pos, right))
+        char_pos = right
+
+    # Emit line breaks that separate logical lines.
+    # This allows interpreting '\n' as a statement separator.
+    if has_code_token:
+        left = char_pos
+        if text in BREAKS:
+            left = char_pos - len(text)
+        append(Token('\n', left, char_pos))
+    return char_pos
 
 # Merge multi-word operators `is not` and `not in`.
 TOKEN_MERGE_TRIE = {
@@ -267,37 +483,66 @@ def preparse(tokens):
     """
     Given a stream of Tokens, produces a stream of Tokens ready for parse.
     """
+    for batch in preparse_batches(token_lines(tokens)):
+        yield from batch
+
+def token_lines(tokens):
+    """
+    Groups a stream of Tokens into lists, each ending after a '\\n'.
+    """
+    line = []
+    for token in tokens:
+        line.append(token)
+        if token.tok == '\n':
+            yield line
+            line = []
+    if line:
+        yield line
+
+def preparse_batches(batches):
+    """
+    Given a stream of lists of Tokens, as from lex_batches, produces a
+    stream of lists of Tokens ready for parse.
+
+    The tokens are those that preparse would produce for the same tokens
+    one at a time.  An `is not` or `not in` split across two lists is
+    merged into the later one.
+    """
     last_token = None
     delayed = []
     trie = TOKEN_MERGE_TRIE
-    for token in tokens:
-        if token.tok == '\n' and last_token in (None, '\n', Token.INDENT_TEXT, ':'):
-            # Ignore newlines that can't separate statements because they
-            # follow a ':' terminated flow control construct, are at the
-            # start of a block ('>>>'), at the start of input (None), or
-            # are part of a reundant blank line ('\n').
-            continue
+    for tokens in batches:
+        out = []
+        append = out.append
+        for token in tokens:
+            if token.tok == '\n' and last_token in (None, '\n', Token.INDENT_TEXT, ':'):
+                # Ignore newlines that can't separate statements because they
+                # follow a ':' terminated flow control construct, are at the
+                # start of a block ('>>>'), at the start of input (None), or
+                # are part of a redundant blank line ('\n').
+                continue
 
-        if token.tok in trie:
-            trie = trie[token.tok]
-            delayed.append(token)
-            if isinstance(trie, bool) and trie:
-                token = Token(
-                    ' '.join(x.tok for x in delayed),
-                    min(x.left     for x in delayed),
-                    max(x.right    for x in delayed))
+            if token.tok in trie:
+                trie = trie[token.tok]
+                delayed.append(token)
+                if isinstance(trie, bool) and trie:
+                    token = Token(
+                        ' '.join(x.tok for x in delayed),
+                        min(x.left     for x in delayed),
+                        max(x.right    for x in delayed))
+                    delayed.clear()
+                    trie = TOKEN_MERGE_TRIE
+                else:
+                    continue
+            elif delayed:
+                out.extend(delayed)
                 delayed.clear()
                 trie = TOKEN_MERGE_TRIE
-            else:
-                continue
-        elif delayed:
-            for delayed_token in delayed:
-                yield delayed_token
-            delayed.clear()
-            trie = TOKEN_MERGE_TRIE
 
-        yield token
-        last_token = token.tok
+            append(token)
+            last_token = token.tok
+        if out:
+            yield out
 
-    for delayed_token in delayed:
-        yield delayed_token
+    if delayed:
+        yield list(delayed)
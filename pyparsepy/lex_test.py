@@ -1,6 +1,25 @@
+import random
+import re
 import unittest
 
-from lex import lex, logical_lines, preparse
+import lex as lexer
+from lex import PhysicalLineMemo, lex, lex_batches, logical_lines, \
+    preparse, preparse_batches
+
+# TOKEN_PATTERN's alternatives in their natural order, which
+# TOKEN_PATTERN reorders for speed.
+REFERENCE_TOKEN_PATTERN = re.compile(
+    '(?:%s)' % '|'.join((
+        lexer.NON_BREAKING_WHITESPACE,
+        lexer.BREAKING_WHITESPACE,
+        lexer.COMMENT,
+        lexer.STRING,
+        lexer.WORD,
+        lexer.NUMBER,
+        lexer.PUNCTUATION,
+        r'.',
+    )),
+    re.DOTALL)
 
 class LogicalLinesTest(unittest.TestCase):
     def test_none(self):
@@ -48,6 +67,42 @@ d e
             ],
             list(logical_lines('f(\n\ndef f():\n pass')))
 
+    def test_memo(self):
+        source_text = 'if x:\n  pass\nelse:\n  pass\n(\n  pass\n)\n'
+        memo = PhysicalLineMemo(max_size=2)
+        self.assertEqual(
+            list(logical_lines(source_text)),
+            list(logical_lines(source_text, memo)))
+        # The last two '  pass\n' lines hit, since each was recently used.
+        self.assertEqual(2, memo.hits)
+        self.assertEqual(5, memo.misses)
+        self.assertEqual(2, len(memo.entries))
+        self.assertAlmostEqual(2 / 7, memo.hit_rate())
+
+    def test_memo_bypasses_long_lines(self):
+        memo = PhysicalLineMemo(max_line_length=4)
+        list(logical_lines('x = """\n"""\nx\n', memo))
+        self.assertEqual((0, 1, 1), (memo.hits, memo.misses, memo.bypassed))
+
+
+class TokenPatternTest(unittest.TestCase):
+    def test_same_as_reference(self):
+        alphabet = ['x', 'b', 'rb', 'U', 'f', ' ', '\t', '\x0c', '\n', '\r',
+                    '"', "'", '"""', '#', '\\', '0', '1.', '.', '.5', 'e+',
+                    '0x', '-', '->', '**=', '//', '!', '(', ']', ':', '\u00e9']
+        rng = random.Random(0)
+        for _ in range(1000):
+            text = ''.join(
+                rng.choice(alphabet) for _ in range(rng.randint(0, 30)))
+            with self.subTest(text):
+                self.assertEqual(
+                    lexer.TOKEN_PATTERN.findall(text),
+                    REFERENCE_TOKEN_PATTERN.findall(text))
+                plain = re.sub(r'["\'#\\\r]', '', text)
+                self.assertEqual(
+                    lexer.PLAIN_TOKEN_PATTERN.findall(plain),
+                    REFERENCE_TOKEN_PATTERN.findall(plain))
+
 
 class LexTest(unittest.TestCase):
     def assert_tokens(self, inp, want):
@@ -77,5 +132,44 @@ class LexTest(unittest.TestCase):
              'f', '(', ')', '\n']
         )
 
+class BatchTest(unittest.TestCase):
+    SOURCE = (
+        'if a is not b:\n'
+        '    x = c not in d\n'
+        '    y = not e is\\\n'
+        '        not f\n'
+        'z = [g not\n'
+        '     in h]\n'
+        'not\n'
+    )
+
+    def assert_same_tokens(self, batches, tokens):
+        as_tuples = lambda ts: [(t.tok, t.left, t.right, t.special) for t in ts]
+        self.assertTrue(all(batches))
+        self.assertEqual(
+            as_tuples([t for batch in batches for t in batch]),
+            as_tuples(tokens))
+
+    def test_same_as_per_token(self):
+        want = list(preparse(lex(self.SOURCE)))
+        self.assertIn('is not', [t.tok for t in want])
+        self.assertIn('not in', [t.tok for t in want])
+        for batch_size in (1, 2, 3, 5, 1024):
+            with self.subTest(batch_size=batch_size):
+                lexed = list(lex_batches(self.SOURCE, batch_size=batch_size))
+                self.assert_same_tokens(lexed, lex(self.SOURCE))
+                self.assert_same_tokens(
+                    list(preparse_batches(lexed)), want)
+
+    def test_merge_across_batches(self):
+        tokens = list(lex('a is not b\nc not in d\n'))
+        want = list(preparse(tokens))
+        # Every way of splitting the tokens in two.
+        for i in range(len(tokens) + 1):
+            with self.subTest(split=i):
+                self.assert_same_tokens(
+                    list(preparse_batches([tokens[:i], tokens[i:]])), want)
+
+
 if __name__ == '__main__':
     unittest.main()
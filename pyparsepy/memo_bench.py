@@ -0,0 +1,50 @@
+"""
+Reports how often PhysicalLineMemo hits on a corpus, and whether it
+speeds up logical_lines.
+
+    python memo_bench.py [file.py ...]
+
+With no files, uses this package's own modules.
+"""
+
+import glob
+import os
+import sys
+
+from bench import best_time
+from lex import PhysicalLineMemo, logical_lines
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+REPEATS = 3
+
+
+def main(paths):
+    sources = []
+    for path in paths or sorted(glob.glob(os.path.join(HERE, '*.py'))):
+        with open(path, encoding='utf-8') as inp:
+            sources.append(inp.read())
+
+    def without_memo():
+        for source_text in sources:
+            for _ in logical_lines(source_text):
+                pass
+
+    def with_memo(memo):
+        for source_text in sources:
+            for _ in logical_lines(source_text, memo):
+                pass
+
+    memo = PhysicalLineMemo()
+    with_memo(memo)
+    print('%d files, %r, hit rate %.1f%%' % (
+        len(sources), memo, memo.hit_rate() * 100))
+    base = best_time(without_memo, REPEATS)
+    # A memo shared across files, as a long-running process would keep,
+    # but new for each run so that it starts cold, at the hit rate above.
+    memoized = best_time(lambda: with_memo(PhysicalLineMemo()), REPEATS)
+    print('logical_lines %.3fs, with memo %.3fs, speedup %.2f' % (
+        base, memoized, base / memoized))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
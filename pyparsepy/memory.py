@@ -0,0 +1,107 @@
+"""
+Measures the memory that lex, preparse and parse use, with tracemalloc.
+
+For each stage, peak is the most memory allocated at once while the
+stage runs, above what was allocated before it, and retained is what is
+still allocated once it is done, which is mostly its output.  Both are
+reported per byte of source, per token and per InnerNode, so that worker
+memory can be sized from the size of the biggest input.
+
+    python memory.py [file.py ...]
+
+With no files, measures this package's own modules.
+"""
+
+import gc
+import glob
+import os
+import sys
+import tracemalloc
+
+from lex import lex, preparse
+from parse import parse
+from traverse import events, ENTER
+
+STAGES = ('lex', 'preparse', 'parse')
+UNITS = ('byte', 'token', 'inner_node')
+
+def measure(source_text):
+    """
+    A dict describing the memory that each stage of parsing source_text
+    uses, with keys:
+
+      'bytes', 'tokens', 'inner_nodes':
+        The size of the source in UTF-8 and of the tokens and tree.
+      'stages':
+        Maps each of STAGES to a dict with 'peak' and 'retained' byte
+        counts.
+
+    Starts tracemalloc if it is not already tracing, and stops it after.
+    """
+    # Compile lexer patterns and build operator tables, which happens
+    # once per process, so that it is not counted against source_text.
+    parse(preparse(lex('x = f(y)\n')))
+    started = not tracemalloc.is_tracing()
+    if started:
+        tracemalloc.start()
+    try:
+        stages = {}
+
+        def run(stage, f):
+            gc.collect()
+            tracemalloc.reset_peak()
+            before, _ = tracemalloc.get_traced_memory()
+            result = f()
+            after, peak = tracemalloc.get_traced_memory()
+            stages[stage] = {'peak': peak - before, 'retained': after - before}
+            return result
+
+        tokens = run('lex', lambda: list(lex(source_text)))
+        tokens = run('preparse', lambda: list(preparse(tokens)))
+        tree = run('parse', lambda: parse(tokens))
+    finally:
+        if started:
+            tracemalloc.stop()
+    return {
+        'bytes': len(source_text.encode('utf-8')),
+        'tokens': len(tokens),
+        'inner_nodes': sum(
+            1 for (event, _) in events(tree) if event is ENTER),
+        'stages': stages,
+    }
+
+def ratios(report):
+    """
+    Maps names like 'parse.peak_per_token' to the bytes that a stage in
+    a report from measure uses per unit of input or output.
+    """
+    counts = {
+        'byte': report['bytes'],
+        'token': report['tokens'],
+        'inner_node': report['inner_nodes'],
+    }
+    result = {}
+    for stage in STAGES:
+        for (kind, n_bytes) in sorted(report['stages'][stage].items()):
+            for unit in UNITS:
+                result['%s.%s_per_%s' % (stage, kind, unit)] = (
+                    n_bytes / max(1, counts[unit]))
+    return result
+
+
+if __name__ == '__main__':
+    def main(paths):
+        here = os.path.dirname(os.path.abspath(__file__))
+        for path in paths or sorted(glob.glob(os.path.join(here, '*.py'))):
+            with open(path, encoding='utf-8') as inp:
+                report = measure(inp.read())
+            print('%s: %d bytes, %d tokens, %d inner nodes' % (
+                path, report['bytes'], report['tokens'],
+                report['inner_nodes']))
+            for stage in STAGES:
+                stats = report['stages'][stage]
+                print('  %-8s peak %9d  retained %9d' % (
+                    stage, stats['peak'], stats['retained']))
+            for (name, ratio) in sorted(ratios(report).items()):
+                print('  %-34s %8.1f' % (name, ratio))
+    main(sys.argv[1:])
@@ -0,0 +1,89 @@
+"""
+Checks that the memory lex, preparse and parse use per byte, per token
+and per InnerNode has not grown beyond the ratios stored in
+memory_baseline.json.
+
+    python memory_bench.py           # Compare against the baseline
+    python memory_bench.py --update  # Store the current ratios
+
+Ratios depend on the Python version, so update the baseline along with
+the interpreter used for benchmarks.
+"""
+
+import json
+import os
+import sys
+import unittest
+
+from memory import measure, ratios
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+BASELINE_PATH = os.path.join(HERE, 'memory_baseline.json')
+# A generated corpus, so that the baseline does not move when this
+# package's own modules change.  Each copy of CORPUS_UNIT differs only in
+# its names and numbers.
+CORPUS_UNIT = '''\
+import os
+from collections import OrderedDict as od_%(i)d
+
+# A comment about thing_%(i)d.
+CONSTANT_%(i)d = {'a': %(i)d, 'b': [1, 2.5, 0x%(i)x], 'c': (None,)}
+
+@decorator(%(i)d)
+class Thing%(i)d(Base):
+    """
+    A docstring for Thing%(i)d.
+    """
+
+    def __init__(self, items=(), *args, **kwargs):
+        self.items = [x * 2 for x in items if x is not None]
+        self.total = sum(self.items) + len(args) - %(i)d
+        self.names = {k: v for (k, v) in kwargs.items() if k not in ('x', 'y')}
+
+    def method_%(i)d(self, value, default=lambda v: -v):
+        if value is None or not self.items:
+            return default(%(i)d)
+        elif value in self.names:
+            return self.names[value] ** 2
+        else:
+            try:
+                result = self.items[value %% len(self.items)]
+            except (IndexError, KeyError) as e:
+                raise ValueError('bad value %%r' %% (value,)) from e
+            finally:
+                self.total += 1
+        while result > 10 and not (result & 1):
+            result >>= 1
+        return f'{result}:{os.sep}' if result else b'\\x00'
+'''
+CORPUS_COPIES = 40
+# How much a ratio may exceed its baseline before the benchmark fails.
+TOLERANCE = 0.2
+
+
+def corpus_ratios():
+    return ratios(measure(''.join(
+        CORPUS_UNIT % {'i': i} for i in range(CORPUS_COPIES))))
+
+
+class MemoryBench(unittest.TestCase):
+    def test_within_baseline(self):
+        with open(BASELINE_PATH, encoding='utf-8') as inp:
+            baseline = json.load(inp)
+        for (name, ratio) in sorted(corpus_ratios().items()):
+            with self.subTest(name):
+                want = baseline[name]
+                sys.stderr.write('%-34s %8.1f  baseline %8.1f\n' % (
+                    name, ratio, want))
+                self.assertLessEqual(ratio, want * (1 + TOLERANCE))
+
+
+if __name__ == '__main__':
+    if sys.argv[1:] == ['--update']:
+        with open(BASELINE_PATH, 'w', encoding='utf-8') as out:
+            baseline = {name: round(ratio, 1)
+                        for (name, ratio) in corpus_ratios().items()}
+            json.dump(baseline, out, indent=2, sort_keys=True)
+            out.write('\n')
+    else:
+        unittest.main()
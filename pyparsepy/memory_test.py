@@ -0,0 +1,34 @@
+import tracemalloc
+import unittest
+
+from memory import measure, ratios, STAGES
+
+class MemoryTest(unittest.TestCase):
+    def test_measure(self):
+        report = measure('def f(x):\n    return [x, x + 1]\n' * 20)
+        self.assertEqual(report['bytes'], 32 * 20)
+        self.assertGreater(report['tokens'], 0)
+        self.assertGreater(report['inner_nodes'], 0)
+        for stage in STAGES:
+            stats = report['stages'][stage]
+            self.assertGreater(stats['retained'], 0)
+            self.assertGreaterEqual(stats['peak'], stats['retained'])
+        self.assertFalse(tracemalloc.is_tracing())
+
+    def test_ratios(self):
+        report = {
+            'bytes': 100,
+            'tokens': 10,
+            'inner_nodes': 0,
+            'stages': {
+                stage: {'peak': 400, 'retained': 200} for stage in STAGES},
+        }
+        got = ratios(report)
+        self.assertEqual(len(got), len(STAGES) * 2 * 3)
+        self.assertEqual(got['lex.peak_per_byte'], 4)
+        self.assertEqual(got['preparse.retained_per_token'], 20)
+        self.assertEqual(got['parse.peak_per_inner_node'], 400)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,233 @@
+"""
+An inverted index from identifiers to where they occur across a corpus
+of source files, for find-references and rename previews.
+"""
+
+import hashlib
+from itertools import chain, repeat
+import json
+import keyword
+import os
+import zlib
+
+from lex import compiled_pattern, logical_lines
+from ops import OPERATORS
+
+OPERATOR_WORDS = frozenset(op.tok for op in OPERATORS)
+
+def is_identifier(tok):
+    """
+    True for token text matched by WORD that is neither a keyword nor
+    an operator like 'and'.
+    """
+    return (compiled_pattern('WORD_PATTERN').fullmatch(tok) is not None
+            and not keyword.iskeyword(tok)
+            and tok not in OPERATOR_WORDS)
+
+def identifier_occurrences(source_text):
+    """
+    Maps each identifier in source_text to the increasing offsets into
+    source_text at which it occurs.
+
+    Offsets count every character, unlike Token.left which skips
+    whitespace and comments, so they come from the tokens of
+    logical_lines, which partition source_text.
+    """
+    occurrences = {}
+    offset = 0
+    for logical_line in logical_lines(source_text):
+        for text in logical_line:
+            if is_identifier(text):
+                occurrences.setdefault(text, []).append(offset)
+            offset += len(text)
+    return occurrences
+
+def source_digest(source_text):
+    """
+    Identifies file content so that unchanged files are not indexed again.
+    """
+    return hashlib.sha256(source_text.encode('utf-8', 'surrogatepass')) \
+        .hexdigest()
+
+class Occurrences:
+    """
+    The sorted (file, offset) pairs at which a name occurs, made as they
+    are iterated over, so that a query for a common name does not build
+    one pair per occurrence up front.
+
+    Unaffected by later changes to the index.
+    """
+
+    def __init__(self, by_file):
+        self.by_file = sorted(by_file.items())
+        self.n_occurrences = sum(map(len, by_file.values()))
+
+    def __len__(self):
+        return self.n_occurrences
+
+    def __iter__(self):
+        return chain.from_iterable(
+            zip(repeat(file), offsets) for (file, offsets) in self.by_file)
+
+    def __eq__(self, other):
+        return tuple(self) == tuple(other)
+
+    def __repr__(self):
+        return 'Occurrences(%r)' % (tuple(self),)
+
+class OccurrenceIndex:
+    """
+    Postings (file, offset) for each identifier in a set of files.
+
+    Files are added, replaced and removed one at a time, so a change to a
+    file only requires lexing that file again.
+    """
+
+    FORMAT_VERSION = 1
+
+    def __init__(self):
+        # file -> (digest, {name: offsets})
+        self.files = {}
+        # name -> {file: offsets}
+        self.postings = {}
+        # name -> Occurrences, dropped when name's postings change
+        self.sorted_postings = {}
+
+    def update(self, file, source_text):
+        """
+        Indexes source_text as the content of file, replacing any earlier
+        content.  Returns False if file was already indexed with the same
+        content.
+        """
+        digest = source_digest(source_text)
+        old = self.files.get(file)
+        if old is not None and old[0] == digest:
+            return False
+        self.add(file, digest, {
+            name: tuple(offsets)
+            for (name, offsets) in identifier_occurrences(source_text).items()
+        })
+        return True
+
+    def add(self, file, digest, occurrences):
+        """
+        Replaces file's postings with occurrences, as from
+        identifier_occurrences but with tuples of offsets.
+        """
+        self.remove(file)
+        self.files[file] = (digest, occurrences)
+        for (name, offsets) in occurrences.items():
+            self.postings.setdefault(name, {})[file] = offsets
+            self.sorted_postings.pop(name, None)
+
+    def remove(self, file):
+        """
+        Drops file's postings, if any.
+        """
+        old = self.files.pop(file, None)
+        if old is None:
+            return
+        for name in old[1]:
+            self.sorted_postings.pop(name, None)
+            by_file = self.postings[name]
+            del by_file[file]
+            if not by_file:
+                del self.postings[name]
+
+    def occurrences(self, name):
+        """
+        The (file, offset) pairs at which name occurs, sorted, as an
+        Occurrences.
+
+        Kept until a file with name changes, so repeated queries cost
+        nothing.
+        """
+        result = self.sorted_postings.get(name)
+        if result is None:
+            result = Occurrences(self.postings.get(name, {}))
+            self.sorted_postings[name] = result
+        return result
+
+    def names(self):
+        return self.postings.keys()
+
+    def save(self, path):
+        """
+        Writes the index to path as compressed JSON with offsets stored
+        as differences between successive offsets.
+
+        The whole index is written each time, so saving after a change to
+        one file costs as much as saving all of them.
+        """
+        files = {}
+        for (file, (digest, occurrences)) in self.files.items():
+            deltas = {}
+            for (name, offsets) in occurrences.items():
+                deltas[name] = [
+                    offsets[i] - (offsets[i - 1] if i else 0)
+                    for i in range(len(offsets))
+                ]
+            files[file] = [digest, deltas]
+        data = json.dumps(
+            {'version': self.FORMAT_VERSION, 'files': files},
+            separators=(',', ':'))
+        temp_path = '%s.%d.tmp' % (path, os.getpid())
+        with open(temp_path, 'wb') as out:
+            out.write(zlib.compress(data.encode('utf-8')))
+        os.replace(temp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        """
+        An index read from a file written by save.
+
+        Raises ValueError if path does not hold a saved index.
+        """
+        with open(path, 'rb') as inp:
+            data = inp.read()
+        try:
+            saved = json.loads(zlib.decompress(data).decode('utf-8'))
+        except zlib.error as e:
+            raise ValueError('not an occurrence index: %s' % path) from e
+        if saved.get('version') != cls.FORMAT_VERSION:
+            raise ValueError('unsupported occurrence index version: %r' % (
+                saved.get('version'),))
+        index = cls()
+        for (file, (digest, deltas)) in saved['files'].items():
+            occurrences = {}
+            for (name, name_deltas) in deltas.items():
+                offsets = []
+                offset = 0
+                for delta in name_deltas:
+                    offset += delta
+                    offsets.append(offset)
+                occurrences[name] = tuple(offsets)
+            index.add(file, digest, occurrences)
+        return index
+
+    def __repr__(self):
+        return 'OccurrenceIndex(files=%d, names=%d)' % (
+            len(self.files), len(self.postings))
+
+
+if __name__ == '__main__':
+    import sys
+
+    def main(index_path, name, files):
+        """
+        Brings the index at index_path up to date with files and prints
+        the occurrences of name.
+        """
+        try:
+            index = OccurrenceIndex.load(index_path)
+        except FileNotFoundError:
+            index = OccurrenceIndex()
+        changed = False
+        for file in files:
+            with open(file, encoding='utf-8') as inp:
+                changed = index.update(file, inp.read()) or changed
+        if changed:
+            index.save(index_path)
+        for (file, offset) in index.occurrences(name):
+            print('%s:%d' % (file, offset))
+    main(sys.argv[1], sys.argv[2], sys.argv[3:])
@@ -0,0 +1,62 @@
+"""
+Reports how long an OccurrenceIndex takes to build, save, load and
+query, and how big it is on disk, for a corpus made of copies of this
+package's own modules.
+
+    python occurrences_bench.py [copies]
+"""
+
+import glob
+import os
+import sys
+import tempfile
+
+from bench import timed
+from occurrences import OccurrenceIndex
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def main(copies):
+    sources = {}
+    for path in sorted(glob.glob(os.path.join(HERE, '*.py'))):
+        with open(path, encoding='utf-8') as inp:
+            source_text = inp.read()
+        for i in range(copies):
+            sources['%d/%s' % (i, os.path.basename(path))] = source_text
+    n_bytes = sum(len(source_text) for source_text in sources.values())
+
+    index = OccurrenceIndex()
+    elapsed, _ = timed(lambda: [
+        index.update(file, source_text)
+        for (file, source_text) in sources.items()])
+    print('%r from %d files, %d chars: built in %.2fs' % (
+        index, len(sources), n_bytes, elapsed))
+
+    file = next(iter(sources))
+    elapsed, _ = timed(
+        lambda: index.update(file, sources[file] + '\nadded_name = 1\n'))
+    print('update one file: %.2fms' % (elapsed * 1e3))
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        path = os.path.join(temp_dir, 'index')
+        elapsed, _ = timed(lambda: index.save(path))
+        print('saved %d bytes in %.2fs' % (os.path.getsize(path), elapsed))
+        elapsed, _ = timed(lambda: OccurrenceIndex.load(path))
+        print('loaded in %.2fs' % elapsed)
+
+    for label in ('first', 'repeated'):
+        query_times = []
+        for name in index.names():
+            elapsed, postings = timed(lambda: index.occurrences(name))
+            query_times.append((elapsed, len(postings), name))
+        query_times.sort()
+        for (stat, i) in (('median', len(query_times) // 2),
+                          ('99th percentile', len(query_times) * 99 // 100),
+                          ('max', -1)):
+            elapsed, n_postings, name = query_times[i]
+            print('%s query %s: %.3fms (%r, %d postings)' % (
+                label, stat, elapsed * 1e3, name, n_postings))
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20)
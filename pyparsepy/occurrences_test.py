@@ -0,0 +1,72 @@
+import os
+import tempfile
+import unittest
+
+from occurrences import OccurrenceIndex, identifier_occurrences, \
+    is_identifier
+
+class IdentifierOccurrencesTest(unittest.TestCase):
+    def test_is_identifier(self):
+        for tok in ('x', '_y', 'self', 'print', 'match', 'Foo2'):
+            self.assertTrue(is_identifier(tok), tok)
+        for tok in ('if', 'not', 'is', 'None', 'pass', 'lambda', '2x',
+                    '(', '"x"', '# x', ' '):
+            self.assertFalse(is_identifier(tok), tok)
+
+    def test_offsets(self):
+        source_text = (
+            'def f(x):\n'
+            '    # x in a comment\n'
+            '    return x + "x" + \\\n'
+            '        g(x)\n'
+        )
+        got = identifier_occurrences(source_text)
+        self.assertEqual(sorted(got), ['f', 'g', 'x'])
+        for (name, offsets) in got.items():
+            for offset in offsets:
+                self.assertEqual(
+                    source_text[offset:offset + len(name)], name)
+        self.assertEqual(len(got['x']), 3)
+
+
+class OccurrenceIndexTest(unittest.TestCase):
+    def test_update_and_remove(self):
+        index = OccurrenceIndex()
+        self.assertTrue(index.update('b.py', 'x = y\n'))
+        self.assertTrue(index.update('a.py', 'y = 1\nprint(y)\n'))
+        self.assertEqual(
+            index.occurrences('y'), (('a.py', 0), ('a.py', 12), ('b.py', 4)))
+        self.assertFalse(index.update('a.py', 'y = 1\nprint(y)\n'))
+        self.assertTrue(index.update('a.py', 'z = 1\n'))
+        self.assertEqual(index.occurrences('y'), (('b.py', 4),))
+        self.assertEqual(sorted(index.names()), ['x', 'y', 'z'])
+        index.remove('b.py')
+        self.assertEqual(index.occurrences('y'), ())
+        self.assertEqual(sorted(index.names()), ['z'])
+
+    def test_save_and_load(self):
+        index = OccurrenceIndex()
+        index.update('a.py', 'def f(a, b):\n    return f(b, a)\n')
+        index.update('b.py', 'from a import f\nf(1, 2)\n')
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = os.path.join(temp_dir, 'index')
+            index.save(path)
+            loaded = OccurrenceIndex.load(path)
+        self.assertEqual(loaded.files, index.files)
+        for name in index.names():
+            self.assertEqual(
+                loaded.occurrences(name), index.occurrences(name))
+        self.assertFalse(
+            loaded.update('b.py', 'from a import f\nf(1, 2)\n'))
+
+    def test_load_not_an_index(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = os.path.join(temp_dir, 'index')
+            with open(path, 'w') as out:
+                out.write('{}')
+            with self.assertRaises(ValueError):
+                OccurrenceIndex.load(path)
+
+
+if __name__ == '__main__':
+    unittest.main()
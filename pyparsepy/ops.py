@@ -2,6 +2,8 @@
 Defines operators for python, and an operator precedence function.
 """
 
+import _thread
+
 from lex import Token
 
 BRACKET_PAIRS = {
@@ -40,6 +42,16 @@ class Operator:
     def __repr__(self):
         return 'Operator(%r, %r)' % (self.tok, self.kind)
 
+    def __reduce__(self):
+        # Parsers compare operators by identity, so the predefined ones
+        # unpickle, for example in another process, as themselves.
+        for (i, op) in enumerate(CANONICAL_OPERATORS):
+            if op is self:
+                return (canonical_operator, (i,))
+        return (
+            Operator,
+            (self.tok, self.kind, self.prec, self.assoc, self.followers))
+
 class OperatorStackElement:
     """
     A parse tree node in the process of being built.
@@ -51,6 +63,10 @@ class OperatorStackElement:
         self.node = []
         self.left = None
         self.right = None
+        # (children scanned, open bracket count, whether count went negative)
+        # so that open_bracket_count only looks at children appended since
+        # the last query.
+        self.bracket_scan = (0, 1 if op.tok == 'lambda' else 0, False)
 
     def __str__(self):
         return 'OSE(%r)' % self.node
@@ -153,6 +169,14 @@ OPERATORS = (
 ROOT_OPERATOR = Operator('', PREFIX, -100)
 NOT_AN_OPERATOR = Operator(None, TOKEN, 100)
 
+CANONICAL_OPERATORS = OPERATORS + (ROOT_OPERATOR, NOT_AN_OPERATOR)
+
+def canonical_operator(index):
+    """
+    The predefined operator at index in CANONICAL_OPERATORS.
+    """
+    return CANONICAL_OPERATORS[index]
+
 def is_nullary(stack_el):
     """
     True for stack elements that consist solely of a zero argument operator.
@@ -165,27 +189,40 @@ def open_bracket_count(stack_el, result_if_negative=None):
 
     If any prefix of the stack_el's nodes contains more close brackets
     than open, and result_if_negative is not None, returns that.
+
+    Stack elements only ever have children appended, so the count is
+    maintained incrementally in stack_el.bracket_scan.  This keeps the
+    cost of repeated queries against an element with many children,
+    like a long '>>>' block body, proportional to the number of new
+    children instead of the total.
     """
-    if stack_el.op.tok == 'lambda':
-        # Not closeable until ':' seen.
-        count = 1
-        for child in stack_el.node:
-            if isinstance(child, Token) and child.tok == ':':
-                count = 0
-                break
-        return count
-    if stack_el.op.tok not in OPEN_BRACKETS:
+    op_tok = stack_el.op.tok
+    is_lambda = op_tok == 'lambda'
+    if not is_lambda and op_tok not in OPEN_BRACKETS:
         return 0
-    count = 0
-    for child in stack_el.node:
+    node = stack_el.node
+    n_children = len(node)
+    start, count, went_negative = stack_el.bracket_scan
+    if start > n_children:
+        # Children were removed, so start over.
+        start, count, went_negative = 0, 1 if is_lambda else 0, False
+    for i in range(start, n_children):
+        child = node[i]
         if isinstance(child, Token):
             tok = child.tok
-            if tok in CLOSE_BRACKETS:
+            if is_lambda:
+                # Not closeable until ':' seen.
+                if tok == ':':
+                    count = 0
+            elif tok in CLOSE_BRACKETS:
                 count -= 1
-                if count < 0 and result_if_negative is not None:
-                    return result_if_negative
+                if count < 0:
+                    went_negative = True
             elif tok in OPEN_BRACKETS:
                 count += 1
+    stack_el.bracket_scan = (n_children, count, went_negative)
+    if went_negative and result_if_negative is not None:
+        return result_if_negative
     return count
 
 def needs_close_bracket(stack_el):
@@ -210,13 +247,14 @@ def needs_close_bracket(stack_el):
     """
     return open_bracket_count(stack_el) > 0
 
-def init():
+def build_tables(operators=OPERATORS):
     """
-    Defines a scope for side-tables for operator functions.
+    The side-tables for operator functions:
+    (grouped_operators, follower_map).
     """
     grouped_operators = {}
     follower_map = {}
-    for operator in OPERATORS:
+    for operator in operators:
         key = (operator.tok, operator.kind)
         if key not in grouped_operators:
             grouped_operators[key] = []
@@ -228,6 +266,30 @@ def init():
 
     for key in grouped_operators:
         grouped_operators[key] = tuple(grouped_operators[key])
+    for follower in follower_map:
+        follower_map[follower] = frozenset(follower_map[follower])
+
+    return grouped_operators, follower_map
+
+def init():
+    """
+    Defines a scope for side-tables for operator functions.
+
+    The side-tables are built on first use, not at import time.
+
+    The returned functions may be called from many threads at once.  The
+    tables are built under a lock and never change afterwards.
+    """
+    grouped_operators = None
+    follower_map = None
+    lock = _thread.allocate_lock()
+
+    def ensure_tables():
+        nonlocal grouped_operators, follower_map
+        with lock:
+            if grouped_operators is not None:
+                return  # Built by another thread
+            grouped_operators, follower_map = build_tables()
 
     def can_nest(outer, inner):
         """
@@ -256,12 +318,16 @@ def init():
         """
         A list of operators with the given token text and kind.
         """
+        if grouped_operators is None:
+            ensure_tables()
         return grouped_operators.get((tok, kind), ())
 
     def followed_by(tok):
         """
         A maximal set of operators, o, such that tok in o.followers.
         """
+        if follower_map is None:
+            ensure_tables()
         return follower_map.get(tok, ())
 
     return can_nest, lookup_operators, followed_by
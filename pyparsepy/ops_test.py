@@ -0,0 +1,20 @@
+import unittest
+
+from ops import build_tables, init, OPERATORS, INFIX, PREFIX
+
+class TablesTest(unittest.TestCase):
+    def test_build_tables(self):
+        grouped_operators, follower_map = build_tables()
+        (plus,) = grouped_operators[('+', INFIX)]
+        self.assertTrue(any(plus is op for op in OPERATORS))
+        self.assertIn(
+            grouped_operators[('lambda', PREFIX)][0], follower_map[':'])
+
+    def test_init_builds_tables_on_first_use(self):
+        _, lookup_operators, followed_by = init()
+        self.assertEqual(1, len(lookup_operators('+', INFIX)))
+        self.assertEqual((), lookup_operators('+', 'no such kind'))
+        self.assertEqual((), followed_by('no such token'))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,93 @@
+"""
+An outline of the definitions and imports in a Python source text, read
+from its logical lines and indentation without parsing.
+
+    python outline.py < file.py
+"""
+
+from lex import compiled_pattern, indentation_value, logical_lines
+
+OUTLINE_KEYWORDS = ('def', 'class', 'import', 'from')
+
+class OutlineEntry:
+    """
+    A logical line that starts a definition or an import.
+
+    kind:
+      One of OUTLINE_KEYWORDS.
+    name:
+      The name defined, or the first module named by an import.
+    depth:
+      How many indented blocks contain the line.
+    left, right:
+      The span of the line from kind through its last token, in the same
+      positions as Token and InnerNode.
+    """
+
+    def __init__(self, kind, name, depth, left, right):
+        self.kind = kind
+        self.name = name
+        self.depth = depth
+        self.left = left
+        self.right = right
+
+    def __eq__(self, other):
+        return (isinstance(other, OutlineEntry)
+                and self.as_tuple() == other.as_tuple())
+
+    def as_tuple(self):
+        return (self.kind, self.name, self.depth, self.left, self.right)
+
+    def __repr__(self):
+        return 'OutlineEntry(%r, %r, %d, %d, %d)' % self.as_tuple()
+
+def outline(source_text):
+    """
+    Yields an OutlineEntry for each logical line of source_text that
+    starts with one of OUTLINE_KEYWORDS, possibly after 'async'.
+
+    Tracks indentation like lex_logical_lines, and token positions like
+    lex, but makes no Tokens and skips preparse and parse.
+    """
+    indenting_whitespace_pattern = compiled_pattern(
+        'INDENTING_WHITESPACE_PATTERN')
+    indent_values = [0]
+    char_pos = 0
+
+    for logical_line in logical_lines(source_text):
+        # The code tokens, as in lex: not whitespace, breaks or comments.
+        code = [text for text in logical_line
+                if text[0] > ' ' and text[0] != '#' and text[0] != '\\']
+        if not code:
+            continue
+        line_left = char_pos
+        char_pos += sum(map(len, code))
+
+        indentation = indenting_whitespace_pattern.search(logical_line[0])
+        value = indentation_value(indentation.group(0) if indentation else '')
+        if indent_values[-1] < value:
+            indent_values.append(value)
+        else:
+            while indent_values[-1] > value:
+                indent_values.pop()
+
+        start = 1 if code[0] == 'async' and len(code) > 1 else 0
+        kind = code[start]
+        if kind not in OUTLINE_KEYWORDS:
+            continue
+        name = ''
+        for text in code[start + 1:]:
+            if text in ('(', ':', ',', 'import', 'as'):
+                break
+            name += text
+        left = line_left + sum(map(len, code[:start]))
+        yield OutlineEntry(kind, name, len(indent_values) - 1, left, char_pos)
+
+
+if __name__ == '__main__':
+    import sys
+
+    def main():
+        for entry in outline(sys.stdin.read()):
+            print('%s%s %s' % ('    ' * entry.depth, entry.kind, entry.name))
+    main()
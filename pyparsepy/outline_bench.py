@@ -0,0 +1,39 @@
+"""
+Compares the time to outline modules with the time to lex, preparse
+and parse them.
+
+    python outline_bench.py [file.py ...]
+
+With no files, uses this package's own modules.
+"""
+
+import glob
+import os
+import sys
+
+from bench import best_time
+from lex import lex, preparse
+from outline import outline
+from parse import parse
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+REPEATS = 5
+
+
+def main(paths):
+    sources = []
+    for path in paths or sorted(glob.glob(os.path.join(HERE, '*.py'))):
+        with open(path, encoding='utf-8') as inp:
+            sources.append(inp.read())
+    parse_time = best_time(
+        lambda: [parse(preparse(lex(s))) for s in sources], REPEATS)
+    outline_time = best_time(lambda: [list(outline(s)) for s in sources], REPEATS)
+    n_entries = sum(len(list(outline(s))) for s in sources)
+    print('%d files, %d outline entries' % (len(sources), n_entries))
+    print('parse    %.3fs' % parse_time)
+    print('outline  %.3fs  speedup %.1f' % (
+        outline_time, parse_time / outline_time))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
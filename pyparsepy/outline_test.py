@@ -0,0 +1,120 @@
+import glob
+import os
+import unittest
+
+from lex import Token, lex, preparse
+from ops import INFIX, POSTFIX
+from outline import OutlineEntry, outline, OUTLINE_KEYWORDS
+from parse import parse
+from traverse import events, ENTER, LEAF
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+def first_token(node):
+    while not isinstance(node, Token):
+        node = node.children[0]
+    return node
+
+def tree_outline(tree):
+    """
+    (kind, depth, left, right) for each statement in a full parse tree
+    that starts a line with one of OUTLINE_KEYWORDS.
+
+    Statements are the first children of '\n' and '>>>' nodes.  A line
+    starts after a '\n', '>>>' or '<<<' leaf, and depth counts the '>>>'
+    leaves before it less the '<<<' leaves.
+    """
+    statements = {}
+    for (event, node) in events(tree):
+        if (event is ENTER
+                and (node.op.tok, node.op.kind) in (
+                    ('\n', POSTFIX), ('>>>', INFIX))
+                and not isinstance(node.children[0], Token)):
+            head = node.children[0]
+            statements[id(first_token(head))] = head
+    entries = []
+    depth = 0
+    previous = None
+    for (event, node) in events(tree):
+        if event is not LEAF:
+            continue
+        tok = node.tok
+        if (tok in OUTLINE_KEYWORDS and id(node) in statements
+                and previous in (None, '\n', '>>>', '<<<', 'async')):
+            head = statements[id(node)]
+            entries.append((tok, depth, head.left, head.right))
+        if tok == '>>>':
+            depth += 1
+        elif tok == '<<<':
+            depth -= 1
+        previous = tok
+    return entries
+
+class OutlineTest(unittest.TestCase):
+    def test_outline(self):
+        source_text = (
+            'import os.path\n'
+            'from . import x\n'
+            '\n'
+            '@decorator\n'
+            'class C(Base):\n'
+            '    # A comment\n'
+            '    def f(self, a=(1,\n'
+            '                   2)):\n'
+            '        def g(): pass\n'
+            '        return g\n'
+            '    async def h(self):\n'
+            '        pass\n'
+            'def \\\n'
+            '        k(): pass\n'
+        )
+        self.assertEqual(
+            [entry.as_tuple()[:3] for entry in outline(source_text)],
+            [
+                ('import', 'os.path', 0),
+                ('from', '.', 0),
+                ('class', 'C', 0),
+                ('def', 'f', 1),
+                ('def', 'g', 2),
+                ('def', 'h', 1),
+                ('def', 'k', 0),
+            ])
+        tokens = list(lex(source_text))
+        (class_entry,) = [
+            entry for entry in outline(source_text) if entry.kind == 'class']
+        self.assertEqual(
+            class_entry,
+            OutlineEntry(
+                'class', 'C', 0,
+                [t for t in tokens if t.tok == 'class'][0].left,
+                [t for t in tokens if t.tok == ':'][0].right))
+
+    def assert_matches_tree(self, source_text):
+        tree = parse(preparse(lex(source_text)))
+        self.assertEqual(
+            [(entry.kind, entry.depth, entry.left, entry.right)
+             for entry in outline(source_text)],
+            tree_outline(tree))
+
+    def test_matches_tree(self):
+        self.assert_matches_tree(
+            'class C:\n'
+            '    def f(self):\n'
+            '        if x:\n'
+            '            import y\n'
+            '        else:\n'
+            '            from z import w\n'
+            '    def g(self): return 1\n'
+            'def h(a,\n'
+            '      b):\n'
+            '    pass\n')
+
+    def test_matches_tree_on_package(self):
+        for path in sorted(glob.glob(os.path.join(HERE, '*.py'))):
+            with self.subTest(path):
+                with open(path, encoding='utf-8') as inp:
+                    self.assert_matches_tree(inp.read())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,338 @@
+"""
+Lexing and parsing a single large source text across worker processes,
+and many source texts across threads.
+"""
+
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import os
+import re
+
+from lex import BREAKS, Token, bracket_depth_after, lex, \
+    lex_logical_lines, logical_lines, preparse
+from ops import lookup_operators, \
+    CLOSE_BRACKETS, OPEN_BRACKETS, ROOT_OPERATOR, INFIX, POSTFIX
+from parse import InnerNode, parse
+from sharedtree import SharedTree, unlink_shared, write_shared
+
+# Below this many characters per chunk, starting workers and moving
+# results between processes costs more than lexing in parallel saves.
+MIN_CHUNK_SIZE = 1 << 20
+
+# Below this many tokens per segment, moving tokens and trees between
+# processes costs more than parsing in parallel saves.
+MIN_SEGMENT_SIZE = 1 << 16
+
+# A line break followed by what looks like the start of a top-level
+# statement.
+SPLIT_CANDIDATE_PATTERN = re.compile(r'\n(?=[A-Za-z_@])')
+
+def split_points(source_text, n_chunks, min_chunk_size=MIN_CHUNK_SIZE):
+    """
+    Increasing offsets at which to split source_text into at most n_chunks
+    chunks of roughly equal size, none much smaller than min_chunk_size.
+
+    These are only guesses at safe split points: a line break could be
+    inside a string or brackets.  See chunk_logical_lines.
+    """
+    n_chars = len(source_text)
+    n_chunks = max(1, min(n_chunks, n_chars // max(1, min_chunk_size)))
+    points = []
+    for i in range(1, n_chunks):
+        target = max(points[-1] if points else 0, n_chars * i // n_chunks)
+        match = SPLIT_CANDIDATE_PATTERN.search(source_text, target)
+        if match is None:
+            break
+        points.append(match.end())
+    return points
+
+def chunk_logical_lines(chunk):
+    """
+    The logical lines of a chunk of source text, and whether lexing can
+    start afresh at the end of the chunk.
+
+    That is the case when the chunk ends with a line break token that is
+    not part of a string, comment or explicit line joining, and the last
+    logical line closes its brackets.  Then logical_lines is in its
+    initial state at the end of the chunk, so lexing the text that follows
+    on its own produces the same logical lines as lexing it after this
+    chunk.
+    """
+    lines = list(logical_lines(chunk))
+    ends_cleanly = (
+        bool(lines)
+        and lines[-1][-1] in BREAKS
+        and not bracket_depth_after(lines[-1]))
+    return lines, ends_cleanly
+
+def parallel_logical_lines(chunks, executor):
+    """
+    The logical lines of the concatenation of chunks, lexed by executor.
+
+    When a chunk does not end cleanly, the rest of the text, from that
+    chunk on, is lexed once in this process, so hostile input, like an
+    unclosed string near the start, costs about as much as lex.
+    """
+    results = executor.map(chunk_logical_lines, chunks)
+    last = len(chunks) - 1
+    try:
+        for (i, (lines, ends_cleanly)) in enumerate(results):
+            if ends_cleanly or i == last:
+                yield from lines
+            else:
+                yield from logical_lines(''.join(chunks[i:]))
+                return
+    finally:
+        # Cancels work on chunks that are no longer needed.
+        results.close()
+
+def lex_parallel(source_text, executor=None, n_chunks=None,
+                 min_chunk_size=MIN_CHUNK_SIZE):
+    """
+    Tokenizes a Python source text like lex, splitting it into chunks
+    that are broken into logical lines in worker processes.
+
+    The result is the same as lex(source_text).  Indentation tokens and
+    offsets depend on all preceding text, so they are computed here from
+    the stitched logical lines.
+
+    executor:
+      A concurrent.futures.Executor whose workers can import this module.
+      If None, a ProcessPoolExecutor is created for the call.
+    n_chunks:
+      Defaults to the number of CPUs.
+    """
+    if n_chunks is None:
+        n_chunks = os.cpu_count() or 1
+    points = split_points(source_text, n_chunks, min_chunk_size)
+    if not points:
+        yield from lex(source_text)
+        return
+    bounds = [0] + points + [len(source_text)]
+    chunks = [source_text[bounds[i]:bounds[i + 1]]
+              for i in range(len(bounds) - 1)]
+    if executor is None:
+        with ProcessPoolExecutor(len(chunks)) as executor:
+            yield from lex_logical_lines(
+                parallel_logical_lines(chunks, executor))
+    else:
+        yield from lex_logical_lines(parallel_logical_lines(chunks, executor))
+
+def can_start_segment(token):
+    """
+    True if token is parsed the same way after a completed top-level
+    statement as at the start of input.
+
+    After a statement, the operator stack holds the root and a '\n'
+    or '>>>' element.  A token that is only a prefix operator or operand
+    commits that element to the root, as at the start of input.  So does
+    a token whose infix and postfix operators bind tighter than both.
+    Others, like 'else', attach to the statement.
+    """
+    (statement_end,) = lookup_operators('\n', POSTFIX)
+    for op_kind in (POSTFIX, INFIX):
+        for op in lookup_operators(token.tok, op_kind):
+            if op.prec <= statement_end.prec:
+                return False
+    return token.tok not in CLOSE_BRACKETS
+
+def segment_points(tokens, n_segments, min_segment_size=MIN_SEGMENT_SIZE):
+    """
+    Increasing indices at which to cut tokens into at most n_segments
+    segments of roughly equal size, none much smaller than
+    min_segment_size.
+
+    Each is just after a '\n' or '<<<' outside any brackets or indented
+    block, before a token for which can_start_segment is true.  That is
+    only a guess at a boundary between top-level statements; see
+    parse_segment.
+    """
+    n_tokens = len(tokens)
+    n_segments = max(1, min(n_segments, n_tokens // max(1, min_segment_size)))
+    points = []
+    target = n_tokens // n_segments
+    depth = 0
+    for i in range(n_tokens):
+        tok = tokens[i].tok
+        if tok in OPEN_BRACKETS:
+            depth += 1
+        elif tok in CLOSE_BRACKETS:
+            depth = max(0, depth - 1)
+        if (i + 1 >= target and not depth and tok in ('\n', '<<<')
+                and i + 1 < n_tokens and can_start_segment(tokens[i + 1])):
+            points.append(i + 1)
+            if len(points) == n_segments - 1:
+                break
+            target = n_tokens * (len(points) + 1) // n_segments
+    return points
+
+def top_level_nodes(tree):
+    """
+    The children of the root operator that parse returned tree for.
+    """
+    if tree.op is ROOT_OPERATOR:
+        return tree.children
+    return (tree,)
+
+def parse_segment(tokens):
+    """
+    The top-level nodes of a segment of tokens, and whether parsing can
+    start afresh after the segment.
+
+    That is the case when the segment's last token completes a top-level
+    statement: it is the '\n' of the last top-level node or the '<<<'
+    that closes its block.  Then the operator stack holds just that node
+    on top of the root, so a following segment that starts with a token
+    for which can_start_segment is true parses the same on its own.
+    """
+    nodes = top_level_nodes(parse(tokens))
+    ends_cleanly = False
+    if nodes and tokens and isinstance(nodes[-1], InnerNode):
+        last = nodes[-1]
+        children = last.children
+        if children and children[-1] is tokens[-1]:
+            if last.op.tok == '\n' and last.op.kind == POSTFIX:
+                ends_cleanly = True
+            elif last.op.tok == '>>>' and last.op.kind == INFIX:
+                depth = 0
+                for child in children:
+                    if isinstance(child, Token):
+                        if child.tok == '>>>':
+                            depth += 1
+                        elif child.tok == '<<<':
+                            depth -= 1
+                ends_cleanly = depth == 0
+    return nodes, ends_cleanly
+
+def parse_segment_shared(tokens):
+    """
+    Like parse_segment, but with the name of a shared memory block from
+    write_shared in place of the nodes.
+    """
+    nodes, ends_cleanly = parse_segment(tokens)
+    return write_shared(nodes), ends_cleanly
+
+def read_segment_shared(result, tokens):
+    """
+    The result of parse_segment from that of parse_segment_shared for the
+    same tokens, whose block it unlinks.  The nodes have tokens as leaves.
+    """
+    name, ends_cleanly = result
+    with SharedTree(name) as tree:
+        tree.unlink()
+        return tree.nodes(tokens), ends_cleanly
+
+def discard_segments_shared(futures):
+    """
+    Unlinks the blocks that futures for parse_segment_shared created or
+    will create, since they will not be read.
+    """
+    for future in futures:
+        if future.cancel():
+            continue
+        try:
+            name, _ = future.result()
+        except Exception:
+            continue
+        unlink_shared(name)
+
+def parallel_top_level_nodes(segments, executor, shared_memory=False):
+    """
+    The top-level nodes of the concatenation of segments, parsed by
+    executor.
+
+    When a segment does not end cleanly, the tokens from that segment on
+    are parsed once in this process.
+    """
+    if shared_memory:
+        futures = deque(
+            executor.submit(parse_segment_shared, segment)
+            for segment in segments)
+        results = (
+            read_segment_shared(futures.popleft().result(), segment)
+            for segment in segments)
+    else:
+        results = executor.map(parse_segment, segments)
+    last = len(segments) - 1
+    try:
+        for (i, (nodes, ends_cleanly)) in enumerate(results):
+            if ends_cleanly or i == last:
+                yield from nodes
+            else:
+                rest = [token for segment in segments[i:]
+                        for token in segment]
+                yield from top_level_nodes(parse(rest))
+                return
+    finally:
+        results.close()
+        if shared_memory:
+            # Whether stopped early or by an error, free every block
+            # that workers wrote and that was not read.
+            discard_segments_shared(futures)
+
+def parse_parallel(tokens, executor=None, n_segments=None,
+                   min_segment_size=MIN_SEGMENT_SIZE, shared_memory=False):
+    """
+    Parses like parse, splitting tokens at boundaries between top-level
+    statements into segments that are parsed in worker processes.
+
+    tokens:
+      A stream of Tokens, as from preparse.
+    executor:
+      A concurrent.futures.Executor whose workers can import this module.
+      If None, a ProcessPoolExecutor is created for the call.
+    n_segments:
+      Defaults to the number of CPUs.
+    shared_memory:
+      If true, workers return trees in shared memory, laid out as in
+      sharedtree.py, instead of pickling them, and the leaves are the
+      Tokens from tokens rather than copies.
+    """
+    tokens = list(tokens)
+    if n_segments is None:
+        n_segments = os.cpu_count() or 1
+    points = segment_points(tokens, n_segments, min_segment_size)
+    if not points:
+        return parse(tokens)
+    bounds = [0] + points + [len(tokens)]
+    segments = [tokens[bounds[i]:bounds[i + 1]]
+                for i in range(len(bounds) - 1)]
+    if executor is None:
+        with ProcessPoolExecutor(len(segments)) as executor:
+            nodes = list(parallel_top_level_nodes(
+                segments, executor, shared_memory))
+    else:
+        nodes = list(parallel_top_level_nodes(
+            segments, executor, shared_memory))
+    # As parse does with the root operator stack element.
+    if len(nodes) == 1 and isinstance(nodes[0], InnerNode):
+        return nodes[0]
+    return InnerNode(
+        nodes,
+        ROOT_OPERATOR,
+        min(node.left for node in nodes) if nodes else 0,
+        max(node.right for node in nodes) if nodes else 0)
+
+def parse_source(source_text):
+    """
+    The parse tree for a Python source text.
+    """
+    return parse(preparse(lex(source_text)))
+
+def parse_many(sources, executor=None, max_workers=None):
+    """
+    A list of the parse trees for each of sources, in order, parsed by
+    executor's workers.
+
+    lex, preparse and parse share no mutable state between calls except
+    what is built once under a lock, so threads can parse concurrently.
+    On a free-threaded build they run in parallel.
+
+    executor:
+      A concurrent.futures.Executor.  If None, a ThreadPoolExecutor with
+      max_workers threads is created for the call.
+    """
+    if executor is None:
+        with ThreadPoolExecutor(max_workers) as executor:
+            return list(executor.map(parse_source, sources))
+    return list(executor.map(parse_source, sources))
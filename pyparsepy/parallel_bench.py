@@ -0,0 +1,80 @@
+"""
+Compares lex_parallel with lex, and parse_parallel with parse, on a large
+generated source text, across worker counts.
+
+    python parallel_bench.py [megabytes]
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+import os
+import sys
+
+from bench import timed
+from lex import lex, preparse
+from parse import parse
+from parallel import lex_parallel, parse_parallel
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def corpus(n_bytes):
+    """
+    Source text of at least n_bytes made by repeating this package's own
+    modules.
+    """
+    sources = []
+    for name in sorted(os.listdir(HERE)):
+        if name.endswith('.py'):
+            with open(os.path.join(HERE, name), encoding='utf-8') as inp:
+                sources.append(inp.read())
+    unit = '\n'.join(sources)
+    return unit * (n_bytes // len(unit) + 1)
+
+
+def worker_counts():
+    n_workers = 1
+    max_workers = os.cpu_count() or 1
+    while True:
+        yield n_workers
+        if n_workers >= max_workers:
+            break
+        n_workers = min(n_workers * 2, max_workers)
+
+
+def started_executor(n_workers):
+    executor = ProcessPoolExecutor(n_workers)
+    # Start the workers before timing.
+    list(executor.map(abs, range(n_workers)))
+    return executor
+
+
+def main(megabytes):
+    source_text = corpus(int(megabytes * (1 << 20)))
+    base_time, want = timed(lambda: [repr(t) for t in lex(source_text)])
+    print('lex %d chars, %d tokens: %.2fs' % (
+        len(source_text), len(want), base_time))
+    for n_workers in worker_counts():
+        with started_executor(n_workers) as executor:
+            elapsed, got = timed(lambda: [
+                repr(t) for t in lex_parallel(
+                    source_text, executor, n_chunks=n_workers,
+                    min_chunk_size=1 << 16)
+            ])
+        assert got == want
+        print('lex_parallel %2d workers: %.2fs  speedup %.2f' % (
+            n_workers, elapsed, base_time / elapsed))
+
+    tokens = list(preparse(lex(source_text)))
+    base_time, _ = timed(lambda: parse(tokens))
+    print('parse %d tokens: %.2fs' % (len(tokens), base_time))
+    for n_workers in worker_counts():
+        with started_executor(n_workers) as executor:
+            elapsed, _ = timed(lambda: parse_parallel(
+                tokens, executor, n_segments=n_workers,
+                min_segment_size=1 << 12))
+        print('parse_parallel %2d workers: %.2fs  speedup %.2f' % (
+            n_workers, elapsed, base_time / elapsed))
+
+
+if __name__ == '__main__':
+    main(float(sys.argv[1]) if len(sys.argv) > 1 else 16)
@@ -0,0 +1,207 @@
+from concurrent.futures import Future, ProcessPoolExecutor, \
+    ThreadPoolExecutor
+import os
+import threading
+import unittest
+
+import lex as lexer
+import ops
+from lex import Token, lex, preparse
+from ops import lookup_operators, ROOT_OPERATOR, POSTFIX
+from parse import parse
+from parallel import chunk_logical_lines, lex_parallel, parse_many, \
+    parallel_top_level_nodes, parse_parallel, segment_points, split_points
+
+SOURCES = (
+    '',
+    'x = 1\n',
+    'def f():\n    return 1\ndef g():\n    pass\nx = f()\n',
+    # Split candidates inside a string, brackets and a joined line.
+    'x = """\nfoo\nbar\n"""\ny = 1\n',
+    'x = (\n1,\nfoo)\nclass C:\n  pass\n',
+    'x = 1 + \\\ny\nz = 2\n',
+    'if x:\n\tif y:\n\t\tf(\n)\nelse:\n  g()\nh()\n',
+    # Comments, blank lines and no trailing newline.
+    '# a\n\nclass C:\n    # b\n\n    x = 1\n\ny = 2',
+    'a = 1\r\nb = 2\r\nc = (\r\nd)\r\n',
+    # Statements that attach to the one before.
+    'if x:\n  a\nelif y:\n  b\nelse:\n  c\nd\ne\n',
+    'try:\n  f()\nexcept:\n  g()\nfinally:\n  h()\n',
+    'f = lambda x:\ny\nz\n',
+)
+
+def describe(node):
+    """
+    Everything about a parse tree that parse_parallel must reproduce.
+    """
+    if isinstance(node, Token):
+        return repr(node)
+    return (node.op, node.left, node.right,
+            [describe(child) for child in node.children])
+
+class ChunkLogicalLinesTest(unittest.TestCase):
+    def test_ends_cleanly(self):
+        self.assertEqual(
+            ([['x', ' ', '=', ' ', '1', '\n']], True),
+            chunk_logical_lines('x = 1\n'))
+
+    def test_open_string(self):
+        self.assertFalse(chunk_logical_lines('x = """\n')[1])
+
+    def test_open_bracket(self):
+        self.assertFalse(chunk_logical_lines('x = (\n')[1])
+
+    def test_joined_line(self):
+        self.assertFalse(chunk_logical_lines('x = 1 + \\\n')[1])
+
+    def test_no_line_break(self):
+        self.assertFalse(chunk_logical_lines('x = 1')[1])
+
+
+class LexParallelTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.executor = ProcessPoolExecutor(2)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.executor.shutdown()
+
+    def assert_same_as_lex(self, source_text):
+        want = [repr(token) for token in lex(source_text)]
+        got = [
+            repr(token) for token in lex_parallel(
+                source_text, self.executor, n_chunks=len(source_text) + 1,
+                min_chunk_size=1)
+        ]
+        self.assertEqual(want, got)
+
+    def test_same_as_lex(self):
+        for source_text in SOURCES:
+            with self.subTest(source_text):
+                self.assert_same_as_lex(source_text)
+
+    def test_concatenated(self):
+        self.assert_same_as_lex(''.join(SOURCES[1:]) * 3)
+
+    def test_split_points(self):
+        source_text = 'x = 1\ny = 2\n  z\nw = 3\n'
+        self.assertEqual([6, 16], split_points(source_text, 4, 1))
+        self.assertEqual([], split_points(source_text, 4, 1000))
+
+class ParseParallelTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.executor = ProcessPoolExecutor(2)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.executor.shutdown()
+
+    def assert_same_as_parse(self, source_text):
+        tokens = list(preparse(lex(source_text)))
+        want = describe(parse(tokens))
+        for shared_memory in (False, True):
+            got = describe(parse_parallel(
+                tokens, self.executor, n_segments=len(tokens) + 1,
+                min_segment_size=1, shared_memory=shared_memory))
+            self.assertEqual(want, got)
+
+    def test_same_as_parse(self):
+        for source_text in SOURCES:
+            with self.subTest(source_text):
+                self.assert_same_as_parse(source_text)
+
+    def test_concatenated(self):
+        self.assert_same_as_parse(''.join(SOURCES[1:]) * 3)
+
+    def test_operators_unpickle_as_themselves(self):
+        tokens = list(preparse(lex('x = 1\ny = 2\n')))
+        tree = parse_parallel(
+            tokens, self.executor, n_segments=2, min_segment_size=1)
+        self.assertIs(ROOT_OPERATOR, tree.op)
+        (statement_end,) = lookup_operators('\n', POSTFIX)
+        for child in tree.children:
+            self.assertIs(statement_end, child.op)
+
+    @unittest.skipUnless(os.path.isdir('/dev/shm'), 'needs /dev/shm')
+    def test_shared_memory_freed(self):
+        tokens = list(preparse(lex('a\nb\nc\nd\n')))
+        segments = [tokens[i:i + 2] for i in range(0, len(tokens), 2)]
+        before = set(os.listdir('/dev/shm'))
+
+        class FailingExecutor:
+            """
+            Fails to parse the second segment.
+            """
+            def __init__(self, executor):
+                self.executor = executor
+                self.n_calls = 0
+
+            def submit(self, fn, *args):
+                self.n_calls += 1
+                if self.n_calls == 2:
+                    future = Future()
+                    future.set_exception(ValueError('failed'))
+                    return future
+                return self.executor.submit(fn, *args)
+
+        with self.assertRaises(ValueError):
+            list(parallel_top_level_nodes(
+                segments, FailingExecutor(self.executor), True))
+        self.assertEqual(before, set(os.listdir('/dev/shm')))
+
+        nodes = parallel_top_level_nodes(segments, self.executor, True)
+        next(nodes)
+        nodes.close()
+        self.assertEqual(before, set(os.listdir('/dev/shm')))
+
+    def test_segment_points(self):
+        tokens = list(preparse(lex(
+            'if x:\n  a\nelse:\n  b\nc\nd\n')))
+        # Not before 'else' or inside the block.
+        self.assertEqual(
+            ['c', 'd'],
+            [tokens[i].tok for i in segment_points(tokens, 100, 1)])
+
+
+class ParseManyTest(unittest.TestCase):
+    N_THREADS = 8
+
+    def test_same_as_parse(self):
+        sources = list(SOURCES) * 50
+        want = [describe(parse(preparse(lex(s)))) for s in sources]
+        with ThreadPoolExecutor(self.N_THREADS) as executor:
+            for _ in range(3):
+                got = parse_many(sources, executor)
+                self.assertEqual(want, [describe(tree) for tree in got])
+
+    def test_default_executor(self):
+        self.assertEqual(
+            [describe(parse(preparse(lex(s)))) for s in SOURCES],
+            [describe(tree) for tree in parse_many(SOURCES, max_workers=2)])
+
+    def test_concurrent_first_use(self):
+        # Lazily built state, compiled patterns and operator tables, is
+        # built once even when many threads need it at the same time.
+        lexer.COMPILED_PATTERNS.clear()
+        _, fresh_lookup_operators, _ = ops.init()
+        barrier = threading.Barrier(self.N_THREADS)
+
+        def first_use(_):
+            barrier.wait()
+            return (
+                [lexer.compiled_pattern(name)
+                 for name in lexer.PATTERN_DEFINITIONS],
+                fresh_lookup_operators('\n', POSTFIX))
+
+        with ThreadPoolExecutor(self.N_THREADS) as executor:
+            results = list(executor.map(first_use, range(self.N_THREADS)))
+        for (patterns, operators) in results[1:]:
+            for (got, want) in zip(patterns, results[0][0]):
+                self.assertIs(got, want)
+            self.assertIs(operators, results[0][1])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,9 +1,21 @@
 """
 An operator precedence parser.
+
+Complexity: parse runs in time linear in the number of tokens, amortized.
+Every stack element that a token scans past is either committed, which
+happens at most once per element, or the scan stops at it.  Searches that
+could otherwise pass over unrelated elements, for a close bracket's
+partner or for the operator awaiting a follower like 'else', use side
+indexes instead, as does the search for the innermost unclosed bracket
+that bounds operator scans.  adversarial_bench.py and depth_bench.py
+check these bounds.
 """
 
-from lex import Token
-from ops import can_nest, lookup_operators, followed_by, \
+from itertools import chain
+import _thread
+
+from lex import Token, lex, preparse
+from ops import can_nest, lookup_operators, \
     needs_close_bracket, is_nullary, \
     OperatorStackElement, Operator, \
     BRACKET_PAIRS, CLOSE_BRACKETS, ROOT_OPERATOR, NOT_AN_OPERATOR, \
@@ -30,15 +42,134 @@ class InnerNode:
     def __repr__(self):
         return repr(self.children)
 
+class LazyBlockNode(InnerNode):
+    """
+    An InnerNode for an indented block, from parse with lazy_blocks, whose
+    body is parsed the first time its children are needed.
+
+    Threads may share a tree with LazyBlockNodes.  The first parse of a
+    body happens once, under a lock per node, and every thread then sees
+    the same children.
+    """
+
+    def __init__(self, children, op, left, right):
+        self.unparsed_children = tuple(children)
+        self.parsed_children = None
+        self.op = op
+        self.left = left
+        self.right = right
+        self.lock = _thread.allocate_lock()
+
+    @property
+    def children(self):
+        parsed_children = self.parsed_children
+        if parsed_children is None:
+            with self.lock:
+                parsed_children = self.parsed_children
+                if parsed_children is None:
+                    children = []
+                    for child in self.unparsed_children:
+                        if isinstance(child, UnparsedBody):
+                            children.extend(child.parse())
+                        else:
+                            children.append(child)
+                    parsed_children = tuple(children)
+                    self.parsed_children = parsed_children
+                    self.unparsed_children = None
+        return parsed_children
+
+    def is_parsed(self):
+        return self.parsed_children is not None
+
+    def __getstate__(self):
+        # Locks do not pickle, so a pickled node is a parsed node.
+        return (self.children, self.op, self.left, self.right)
+
+    def __setstate__(self, state):
+        children, op, left, right = state
+        self.__init__((), op, left, right)
+        self.parsed_children = children
+        self.unparsed_children = None
 
-def parse(tokens):
+class UnparsedBody:
+    """
+    The tokens of a block body, after a '>>>' token and before its '<<<'.
+    """
+
+    def __init__(self, op, indent, tokens):
+        self.op = op
+        self.indent = indent
+        self.tokens = tokens
+
+    def parse(self):
+        """
+        The nodes that parse would have put between the '>>>' and '<<<'.
+        """
+        # Start inside an element like the one that the '>>>' opened.
+        block = OperatorStackElement(self.op)
+        block.node.append(self.indent)
+        block.left = self.indent.left
+        block.right = self.indent.right
+        return parser(lazy_blocks=True)(self.tokens, block)
+
+
+def parse(tokens, lazy_blocks=False):
     """
     Given tokens, returns a parse tree such that the leaves in a prefix
     traversal produce the same sequence of tokens.
+
+    lazy_blocks:
+      If true, the bodies of indented blocks are kept as tokens and
+      parsed only when first needed.  See LazyBlockNode.  The tree is the
+      same, but getting just the outline of a module is much cheaper.
+    """
+    return parser(lazy_blocks)(tokens)
+
+def parse_token_batches(batches, lazy_blocks=False):
+    """
+    Like parse, but given lists of tokens, as from preparse_batches.
+    """
+    return parser(lazy_blocks)(chain.from_iterable(batches))
+
+def parser(lazy_blocks=False):
     """
-    stack = [
-        OperatorStackElement(ROOT_OPERATOR),
-    ]
+    A function that parses token streams like parse, one after another,
+    reusing its operator stack, side indexes and helper closures.
+
+    Not safe to call from more than one thread at once.
+    """
+    stack = []
+    # Side indexes into the stack so that a token need not scan the
+    # whole stack to find the element it belongs to.  Each holds
+    # (depth, element) pairs, innermost last, for elements pushed onto
+    # the stack.  Elements only ever gain children, so once an entry goes
+    # stale, because its element was committed or can no longer match,
+    # it stays stale, and stale entries are dropped as they are found.
+    unclosed = []  # Elements that may need a close bracket
+    awaiting_close = {close: [] for close in CLOSE_BRACKETS}
+    awaiting_follower = {}
+    # Elements for '>>>' blocks whose bodies are UnparsedBody instances.
+    deferred = set()
+
+    def push(el, depth):
+        stack[depth:] = [el]
+        entry = (depth, el)
+        op = el.op
+        partner = BRACKET_PAIRS.get(op.tok)
+        if partner is not None:
+            awaiting_close[partner].append(entry)
+        if partner is not None or op.tok == 'lambda':
+            unclosed.append(entry)
+        for follower in op.followers:
+            awaiting_follower.setdefault(follower, []).append(entry)
+
+    def innermost(entries, is_live):
+        while entries:
+            depth, el = entries[-1]
+            if depth < len(stack) and stack[depth] is el and is_live(el):
+                return depth
+            entries.pop()
+        return -1
 
     def commit_to(depth):
         n = len(stack)
@@ -49,7 +180,8 @@ def parse(tokens):
 
     def add_node_to(el, parent):
         update_position_metadata(parent, el.left, el.right)
-        parent.node.append(InnerNode(
+        node_type = LazyBlockNode if el in deferred else InnerNode
+        parent.node.append(node_type(
             el.node,
             op=el.op,
             left=el.left,
@@ -70,112 +202,217 @@ def parse(tokens):
         else:
             el.right = max(el.right, right)
 
-    for token in tokens:
-        tok = token.tok
-        used_token = False
-
-        follows = followed_by(tok)
-        if follows:
-            for i in range(len(stack) - 1, -1, -1):
-                el = stack[i]
-                op = el.op
-                node = el.node
-                if op in follows:
-                    tok_index = index_of_token(node, op.tok)
-                    max_follower_seen = -1
-                    for fi in range(0, len(op.followers)):
-                        follower = op.followers[fi]
-                        ti = index_of_token(node, follower, tok_index + 1)
-                        if ti >= 0:
-                            max_follower_seen = fi
-                            tok_index = ti
-                    fip = (
-                        op.followers.index(tok, max_follower_seen + 1)
-                        if tok in op.followers[max_follower_seen+1:] else None)
-                    if fip is not None:
-                        commit_to(i + 1)
-                        add_token_to(token, el)
-                        used_token = True
-                        break
-                if needs_close_bracket(el):
+    def deferring_bodies(tokens):
+        """
+        Yields tokens, but after a '>>>' that opens a block, keeps its
+        body back as an UnparsedBody on the block's element when that is
+        sure to parse the same on its own: when brackets in the body,
+        including '>>>' and '<<<', pair up, and no nested '>>>' comes
+        while a 'lambda' awaits its ':', which would stop that '>>>'
+        opening a block, and each 'lambda' gets its ':' inside the same
+        brackets.  Then no token in the body can affect elements below
+        the block's.
+        """
+        tokens = iter(tokens)
+        for token in tokens:
+            yield token
+            if token.tok != '>>>':
+                continue
+            block = stack[-1]
+            if (block.op.tok != '>>>' or block.node[-1] is not token
+                    or not needs_close_bracket(block)):
+                continue
+            body = []
+            closers = []
+            # The bracket depth of each 'lambda' awaiting its ':', which
+            # only a ':' at that depth, not one in brackets, gives it.
+            lambda_depths = []
+            end = None
+            for token in tokens:
+                tok = token.tok
+                if tok == 'lambda':
+                    lambda_depths.append(len(closers))
+                elif tok == ':' and lambda_depths \
+                        and lambda_depths[-1] == len(closers):
+                    lambda_depths.pop()
+                elif tok == '>>>' and lambda_depths:
+                    end = token
                     break
-        if used_token: continue
+                if tok in BRACKET_PAIRS:
+                    closers.append(BRACKET_PAIRS[tok])
+                elif tok in CLOSE_BRACKETS:
+                    if closers and closers[-1] == tok:
+                        closers.pop()
+                    else:
+                        end = token
+                        break
+                    if lambda_depths and lambda_depths[-1] > len(closers):
+                        # Closes brackets around a lambda awaiting ':'.
+                        end = token
+                        break
+                body.append(token)
+            if (end is not None and end.tok == '<<<' and body and not closers
+                    and not lambda_depths):
+                block.node.append(UnparsedBody(block.op, block.node[-1], body))
+                update_position_metadata(block, body[0].left, body[-1].right)
+                deferred.add(block)
+            else:
+                # Parse the body as usual.
+                yield from body
+            if end is not None:
+                yield end
 
-        if tok in CLOSE_BRACKETS:
-            for i in range(len(stack) - 1, -1, -1):
-                el = stack[i]
-                partner = BRACKET_PAIRS.get(el.op.tok)
-                if tok == partner and needs_close_bracket(el):
+    def parse_tokens(tokens, enclosing=None):
+        """
+        The parse tree for tokens.
+
+        If enclosing is an element for a '>>>' block, parses tokens as
+        that block's body, and returns the children they add to it.
+        """
+        stack[:] = [
+            OperatorStackElement(ROOT_OPERATOR),
+        ]
+        unclosed.clear()
+        for entries in awaiting_close.values():
+            entries.clear()
+        awaiting_follower.clear()
+        deferred.clear()
+        if enclosing is not None:
+            push(enclosing, 1)
+        if lazy_blocks:
+            tokens = deferring_bodies(tokens)
+
+        for token in tokens:
+            tok = token.tok
+            used_token = False
+
+            if tok in awaiting_follower:
+                # The innermost element awaiting tok, unless there is an
+                # unclosed bracket between it and the top of the stack.
+                i = innermost(
+                    awaiting_follower[tok],
+                    lambda el: tok in remaining_followers(el))
+                if i >= 0 and i >= innermost(unclosed, needs_close_bracket):
                     commit_to(i + 1)
-                    add_token_to(token, el)
+                    add_token_to(token, stack[i])
                     used_token = True
-                    break
-        if used_token: continue
+            if used_token: continue
+
+            if tok in CLOSE_BRACKETS:
+                i = innermost(awaiting_close[tok], needs_close_bracket)
+                if i >= 0:
+                    commit_to(i + 1)
+                    add_token_to(token, stack[i])
+                    used_token = True
+            if used_token: continue
 
-        for op_kind in (POSTFIX, INFIX):
-            if used_token: break
-            for op in lookup_operators(tok, op_kind):
-                left_depth = None
+            # An operator cannot take an operand from across an unclosed
+            # bracket, so infix and postfix scans stop above the innermost.
+            floor = -1
+            for op_kind in (POSTFIX, INFIX):
+                if used_token: break
+                for op in lookup_operators(tok, op_kind):
+                    if floor < 0:
+                        floor = innermost(unclosed, needs_close_bracket)
+                    left_depth = None
+                    candidate = OperatorStackElement(op)
+                    for i in range(len(stack) - 1, floor, -1):
+                        el = stack[i]
+                        # Precedence does not increase going down the stack
+                        # until the next open bracket, so once el cannot
+                        # nest in candidate, nothing further down can.
+                        if not can_nest(candidate, el): break
+                        if i and can_nest(stack[i - 1], candidate):
+                            left_depth = i
+                    if left_depth is not None:
+                        el = stack[left_depth]
+                        commit_to(left_depth + 1)
+                        add_node_to(el, candidate)
+                        add_token_to(token, candidate)
+                        push(candidate, left_depth)
+                        used_token = True
+                        break
+            if used_token: continue
+
+            for op in lookup_operators(tok, PREFIX):
+                if used_token: break
                 candidate = OperatorStackElement(op)
+                add_token_to(token, candidate)
                 for i in range(len(stack) - 1, -1, -1):
                     el = stack[i]
-                    if needs_close_bracket(el): break
-                    if (can_nest(candidate, el)
-                            and i
-                            and can_nest(
-                                stack[i - 1],
-                                candidate)):
-                        left_depth = i
-                if left_depth is not None:
-                    el = stack[left_depth]
-                    commit_to(left_depth + 1)
-                    add_node_to(el, candidate)
-                    add_token_to(token, candidate)
-                    stack[left_depth] = candidate
-                    used_token = True
-                    break
-        if used_token: continue
+                    node = el.node
+                    stackop = el.op
+                    if stackop.kind != POSTFIX and can_nest(el, candidate):
+                        commit_to(i + 1)
+                        push(candidate, i + 1)
+                        used_token = True
+                        break
+            if used_token: continue
 
-        for op in lookup_operators(tok, PREFIX):
-            if used_token: break
-            candidate = OperatorStackElement(op)
+            candidate = OperatorStackElement(NOT_AN_OPERATOR)
             add_token_to(token, candidate)
+            close_to = None
             for i in range(len(stack) - 1, -1, -1):
                 el = stack[i]
-                node = el.node
-                stackop = el.op
-                if stackop.kind != POSTFIX and can_nest(el, candidate):
-                    commit_to(i + 1)
-                    stack.append(candidate)
-                    used_token = True
+                if el.op.kind != POSTFIX and can_nest(el, candidate):
                     break
-        if used_token: continue
-
-        candidate = OperatorStackElement(NOT_AN_OPERATOR)
-        add_token_to(token, candidate)
-        close_to = None
-        for i in range(len(stack) - 1, -1, -1):
-            el = stack[i]
-            if el.op.kind != POSTFIX and can_nest(el, candidate):
-                break
-            close_to = i
-        if close_to is not None:
-            commit_to(close_to)
-
-        top = stack[-1]
-        if top.op is NOT_AN_OPERATOR and not is_nullary(top):
-            add_token_to(token, top)
-        else:
-            stack.append(candidate)
+                close_to = i
+            if close_to is not None:
+                commit_to(close_to)
+
+            top = stack[-1]
+            if top.op is NOT_AN_OPERATOR and not is_nullary(top):
+                add_token_to(token, top)
+            else:
+                stack.append(candidate)
+
+        if enclosing is not None:
+            commit_to(2)
+            # Checked even under -O, where an escaped body would otherwise
+            # make a tree that silently differs from the eager parse.
+            if not (stack[1:] == [enclosing] and not stack[0].node
+                    and needs_close_bracket(enclosing)):
+                raise AssertionError('block body escaped its block')
+            return enclosing.node[1:]
 
-    commit_to(1)
-    if len(stack[0].node) == 1 and isinstance(stack[0].node[0], InnerNode):
-        return stack[0].node[0]
-    return InnerNode(
-        stack[0].node,
-        ROOT_OPERATOR,
-        stack[0].left or 0,
-        stack[0].right or 0)
+        commit_to(1)
+        if len(stack[0].node) == 1 and isinstance(stack[0].node[0], InnerNode):
+            return stack[0].node[0]
+        return InnerNode(
+            stack[0].node,
+            ROOT_OPERATOR,
+            stack[0].left or 0,
+            stack[0].right or 0)
+
+    return parse_tokens
+
+def parse_batch(sources):
+    """
+    The parse trees for a list of Python source texts, in order.
+
+    For many small sources, like single expressions or notebook cells,
+    this is faster than calling parse on each because one parser is
+    reused for all of them.
+    """
+    parse_tokens = parser()
+    return [parse_tokens(preparse(lex(source_text)))
+            for source_text in sources]
+
+def remaining_followers(el):
+    """
+    The followers of el's operator that may still appear among its children.
+    """
+    op = el.op
+    node = el.node
+    tok_index = index_of_token(node, op.tok)
+    max_follower_seen = -1
+    for fi in range(0, len(op.followers)):
+        follower = op.followers[fi]
+        ti = index_of_token(node, follower, tok_index + 1)
+        if ti >= 0:
+            max_follower_seen = fi
+            tok_index = ti
+    return op.followers[max_follower_seen + 1:]
 
 def index_of_token(children, tok, start=0):
     for i in range(start, len(children)):
@@ -186,9 +423,8 @@ def index_of_token(children, tok, start=0):
 
 
 if __name__ == '__main__':
-    import json
     import sys
-    from lex import lex, preparse
+    from traverse import write_json
 
     def main():
         source_text = sys.stdin.read()
@@ -197,12 +433,6 @@ if __name__ == '__main__':
 
         parse_tree = parse(tokens)
 
-        class ParseTreeEncoder(json.JSONEncoder):
-            def default(self, o):
-                if isinstance(o, InnerNode):
-                    return o.children
-                if isinstance(o, Token):
-                    return o.tok
-                return json.JSONEncoder.default(self, o)
-        print(json.dumps(parse_tree, cls=ParseTreeEncoder, indent=2))
+        write_json(parse_tree, sys.stdout, indent=2)
+        sys.stdout.write('\n')
     main()
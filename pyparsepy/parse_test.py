@@ -1,8 +1,12 @@
-import unittest
 import json
+import pickle
+import sys
+import threading
+import unittest
 
-from lex import Token, lex, preparse
-from parse import InnerNode, parse
+from lex import Token, lex, lex_batches, preparse, preparse_batches
+from parse import InnerNode, LazyBlockNode, parse, parse_batch, \
+    parse_token_batches
 
 class ParseTreeEncoder(json.JSONEncoder):
     def default(self, o):
@@ -246,5 +250,167 @@ elif y():
             ]
         )
 
+    def test_mismatched_close_bracket(self):
+        self.assert_tree(
+            '[(x]',
+            [
+                [
+                    '[',
+                    ['(', ['x']],
+                    ']',
+                ],
+                '\n',
+            ]
+        )
+
+    def test_follower_not_seen_through_bracket(self):
+        self.assert_tree(
+            'x if y else (z if w) else v',
+            [
+                [
+                    ['x'],
+                    'if',
+                    ['y'],
+                    'else',
+                    [
+                        '(',
+                        [['z'], 'if', ['w']],
+                        ')',
+                    ],
+                ],
+                'else',
+                [['v'], '\n'],
+            ]
+        )
+
+    def test_parse_batch(self):
+        # Unclosed brackets and pending followers must not leak from one
+        # source into the next.
+        sources = ['(a, [b', 'x)', 'if x:\n  y', 'else: z', '', 'f(x) + 1']
+        trees = parse_batch(sources)
+        self.assertEqual(len(trees), len(sources))
+        for (source_text, tree) in zip(sources, trees):
+            want = parse(preparse(lex(source_text)))
+            self.assertEqual(
+                json.dumps(tree, cls=ParseTreeEncoder),
+                json.dumps(want, cls=ParseTreeEncoder))
+            self.assertEqual((tree.left, tree.right), (want.left, want.right))
+
+    def test_parse_token_batches(self):
+        source_text = 'if a is not b:\n  c = (d\n    not in e)\nf()\n'
+        want = parse(preparse(lex(source_text)))
+        for batch_size in (1, 2, 7):
+            with self.subTest(batch_size=batch_size):
+                tree = parse_token_batches(preparse_batches(
+                    lex_batches(source_text, batch_size=batch_size)))
+                self.assertEqual(
+                    json.dumps(tree, cls=ParseTreeEncoder),
+                    json.dumps(want, cls=ParseTreeEncoder))
+                self.assertEqual(
+                    (tree.left, tree.right), (want.left, want.right))
+
+    def assert_same_when_lazy(self, source_text):
+        tokens = list(preparse(lex(source_text)))
+        eager = parse(tokens)
+        lazy = parse(tokens, lazy_blocks=True)
+
+        def describe(node):
+            if isinstance(node, Token):
+                return repr(node)
+            return (node.op, node.left, node.right,
+                    [describe(child) for child in node.children])
+        self.assertEqual(describe(eager), describe(lazy))
+
+    def test_lazy_blocks(self):
+        source_text = (
+            'class C:\n'
+            '    def f(self):\n'
+            '        if x:\n'
+            '            return [\n'
+            '                1]\n'
+            '    g = lambda: (yield)\n'
+            'def h(): pass\n'
+            'while True:\n'
+            '    break\n'
+        )
+        tree = parse(preparse(lex(source_text)), lazy_blocks=True)
+        (class_block, while_block) = [
+            child for child in tree.children
+            if isinstance(child, LazyBlockNode)]
+        self.assertFalse(class_block.is_parsed())
+        self.assertEqual(
+            [child.tok for child in class_block.children
+             if isinstance(child, Token)],
+            ['>>>', '<<<'])
+        self.assertTrue(class_block.is_parsed())
+        method_block = [child for child in class_block.children
+                        if isinstance(child, LazyBlockNode)][0]
+        self.assertFalse(method_block.is_parsed())
+        self.assertFalse(while_block.is_parsed())
+        self.assert_same_when_lazy(source_text)
+
+    def test_lazy_blocks_fall_back(self):
+        # A nested '>>>' after a lambda awaiting ':' is not a block, so
+        # its '<<<' closes the outer block and the body must be parsed.
+        self.assert_same_when_lazy('c\n lambda\n  n')
+        # Unpaired brackets in a body.
+        self.assert_same_when_lazy('if x:\n  y)\nz\n')
+        self.assert_same_when_lazy('(x\nif y:\n  z\n')
+        # A ':' in brackets does not give a lambda its ':'.
+        self.assert_same_when_lazy('n\n lambda{:}\n\ta')
+        self.assert_same_when_lazy('n\n (lambda)\n')
+
+    def test_lazy_blocks_shared_between_threads(self):
+        n_threads = 4
+        tokens = list(preparse(lex(
+            'def f():\n  if x:\n    y\n  z\ndef g():\n' +
+            '  a = b + c\n' * 200)))
+        # Switch threads often, so that they race for the first parse.
+        self.addCleanup(sys.setswitchinterval, sys.getswitchinterval())
+        sys.setswitchinterval(1e-6)
+        for _ in range(20):
+            tree = parse(tokens, lazy_blocks=True)
+            barrier = threading.Barrier(n_threads)
+            seen = [None] * n_threads
+
+            def read(i):
+                barrier.wait()
+                seen[i] = [
+                    (node, node.children) for node in lazy_nodes(tree)]
+
+            threads = [threading.Thread(target=read, args=(i,))
+                       for i in range(n_threads)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            for pairs in seen[1:]:
+                self.assertEqual(len(seen[0]), len(pairs))
+                for ((a, a_children), (b, b_children)) in zip(
+                        seen[0], pairs):
+                    self.assertIs(a, b)
+                    self.assertIs(a_children, b_children)
+
+    def test_lazy_blocks_pickle(self):
+        source_text = 'def f():\n  if x:\n    y\n'
+        tree = parse(preparse(lex(source_text)), lazy_blocks=True)
+        self.assertEqual(
+            json.dumps(parse(preparse(lex(source_text))),
+                       cls=ParseTreeEncoder),
+            json.dumps(pickle.loads(pickle.dumps(tree)),
+                       cls=ParseTreeEncoder))
+
+def lazy_nodes(tree):
+    """
+    The LazyBlockNodes in tree, parsing them on the way.
+    """
+    stack = [tree]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, LazyBlockNode):
+            yield node
+        if isinstance(node, InnerNode):
+            stack.extend(node.children)
+
 if __name__ == '__main__':
     unittest.main()
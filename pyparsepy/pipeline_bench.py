@@ -0,0 +1,47 @@
+"""
+Compares the batched pipeline, lex_batches, preparse_batches and
+parse_token_batches, with the per-token one, lex, preparse and parse, on
+this package's own modules.
+
+    python pipeline_bench.py
+"""
+
+import glob
+import os
+
+from bench import best_time
+from lex import lex, lex_batches, preparse, preparse_batches
+from parse import parse, parse_token_batches
+
+REPEATS = 7
+BATCH_SIZES = (64, 1024, 16384)
+
+
+def main():
+    here = os.path.dirname(os.path.abspath(__file__))
+    source_text = ''
+    for path in sorted(glob.glob(os.path.join(here, '*.py'))):
+        with open(path, encoding='utf-8') as inp:
+            source_text += inp.read()
+    n = sum(1 for _ in lex(source_text))
+    print('%d tokens' % n)
+
+    token_time = best_time(lambda: list(preparse(lex(source_text))), REPEATS)
+    print('per-token lex+preparse %8.0f tokens/ms' % (n / token_time / 1e3))
+    for batch_size in BATCH_SIZES:
+        batch_time = best_time(lambda: list(preparse_batches(
+            lex_batches(source_text, batch_size=batch_size))), REPEATS)
+        print('  batches of %-5d     %8.0f tokens/ms  speedup %.2f' % (
+            batch_size, n / batch_time / 1e3, token_time / batch_time))
+
+    token_time = best_time(lambda: parse(preparse(lex(source_text))), REPEATS)
+    print('per-token pipeline     %8.0f tokens/ms' % (n / token_time / 1e3))
+    for batch_size in BATCH_SIZES:
+        batch_time = best_time(lambda: parse_token_batches(preparse_batches(
+            lex_batches(source_text, batch_size=batch_size))), REPEATS)
+        print('  batches of %-5d     %8.0f tokens/ms  speedup %.2f' % (
+            batch_size, n / batch_time / 1e3, token_time / batch_time))
+
+
+if __name__ == '__main__':
+    main()
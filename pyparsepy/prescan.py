@@ -0,0 +1,137 @@
+"""
+A NumPy-vectorized prescan of a source text for logical_lines.
+
+NumPy is optional.  Without it, this module's logical_lines and lex are
+the ones in lex.
+"""
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+import lex as lexer
+from lex import compiled_pattern, join_physical_lines, lex_logical_lines
+
+# Characters that can start a string, a comment, an explicit line join
+# or a line break other than '\n'.  A line without any of these is a
+# physical line on its own, so it can be found without a regex, and its
+# bracket characters are all bracket tokens.
+SPECIAL_CHARS = '"\'#\\\r'
+
+if numpy is not None:
+    # 1 for SPECIAL_CHARS, by ASCII code
+    SPECIAL_TABLE = numpy.zeros(128, numpy.int8)
+    SPECIAL_TABLE[[ord(c) for c in SPECIAL_CHARS]] = 1
+    # The change in bracket depth, by ASCII code
+    BRACKET_TABLE = numpy.zeros(128, numpy.int8)
+    BRACKET_TABLE[[ord(c) for c in '([{']] = 1
+    BRACKET_TABLE[[ord(c) for c in ')]}']] = -1
+
+# The number of characters that scan_lines looks at in bulk, which bounds
+# its memory.  A longer line makes a longer window.
+WINDOW = 1 << 14
+
+def scan_lines(source_text, window=WINDOW):
+    """
+    Classifies the '\\n' terminated lines of source_text in bulk, a window
+    of lines at a time.
+
+    Yields for each line (start, end, bracket_change): its start and end
+    offsets, with its end after its '\\n', and for lines free of
+    SPECIAL_CHARS, its bracket_change per lex.join_physical_lines, or None
+    for other lines.
+    """
+    n_chars = len(source_text)
+    pos = 0
+    while pos < n_chars:
+        if pos + window >= n_chars:
+            stop = n_chars
+        else:
+            # Cut after the last '\n' in the window, or after the first
+            # one past it for a line longer than the window.
+            stop = source_text.rfind('\n', pos, pos + window) + 1
+            if stop <= pos:
+                stop = source_text.find('\n', pos + window) + 1 or n_chars
+        yield from scan_window(source_text, pos, stop)
+        pos = stop
+
+def scan_window(source_text, pos, stop):
+    """
+    scan_lines' lines in source_text[pos:stop], which must start a line
+    and end one.
+    """
+    codes = numpy.frombuffer(
+        source_text[pos:stop].encode('utf-32-le', 'surrogatepass'),
+        dtype=numpy.uint32)
+    n_chars = len(codes)
+    line_breaks = numpy.flatnonzero(codes == ord('\n'))
+    starts = numpy.concatenate(([0], line_breaks + 1))
+    ends = numpy.concatenate((line_breaks + 1, [n_chars]))
+    if ends[-1] == starts[-1]:
+        # No line after a trailing '\n'.
+        starts = starts[:-1]
+        ends = ends[:-1]
+
+    def counts_before(values):
+        # Sums before each offset, so that a line's sum is a difference.
+        # A window is far shorter than 2**31 characters.
+        return numpy.concatenate(([0], numpy.cumsum(values, dtype=numpy.int32)))
+
+    # Index the tables by code point, with everything past ASCII at 127.
+    ascii_codes = numpy.minimum(codes, 127)
+    specials_before = counts_before(SPECIAL_TABLE[ascii_codes])
+    plain = specials_before[ends] == specials_before[starts]
+    depth = counts_before(BRACKET_TABLE[ascii_codes])
+    net = depth[ends] - depth[starts]
+    # The lowest depth after any character in each line.
+    lowest = numpy.minimum.reduceat(depth[1:], starts)
+    low = numpy.minimum(0, lowest - depth[starts])
+
+    for (start, end, line_net, line_low, line_plain) in zip(
+            (starts + pos).tolist(), (ends + pos).tolist(), net.tolist(),
+            low.tolist(), plain.tolist()):
+        yield start, end, (line_net, line_low) if line_plain else None
+
+def physical_lines(source_text):
+    """
+    The same as lex.physical_lines, but using scan_lines so that lines
+    free of SPECIAL_CHARS need neither EXPLICIT_LINE_PATTERN to find
+    them nor a pass over their tokens to count brackets, and are split
+    into tokens by the simpler PLAIN_TOKEN_PATTERN.
+    """
+    explicit_line_pattern = compiled_pattern('EXPLICIT_LINE_PATTERN')
+    token_pattern = compiled_pattern('TOKEN_PATTERN')
+    plain_token_pattern = compiled_pattern('PLAIN_TOKEN_PATTERN')
+
+    lines = scan_lines(source_text)
+    start, end, bracket_change = next(lines, (None, None, None))
+    n_chars = len(source_text)
+    pos = 0
+    while pos < n_chars:
+        if bracket_change is not None and start == pos:
+            tokens = plain_token_pattern.findall(source_text, pos, end)
+            yield tokens, bracket_change
+            pos = end
+            start, end, bracket_change = next(lines, (None, None, None))
+        else:
+            match = explicit_line_pattern.match(source_text, pos)
+            pos = match.end()
+            yield token_pattern.findall(match.group(0)), None
+            while start is not None and start < pos:
+                start, end, bracket_change = next(lines, (None, None, None))
+
+def logical_lines(source_text):
+    """
+    The same as lex.logical_lines, using the prescan when NumPy is
+    available.
+    """
+    if numpy is None:
+        return lexer.logical_lines(source_text)
+    return join_physical_lines(physical_lines(source_text))
+
+def lex(source_text):
+    """
+    The same as lex.lex, using the prescan when NumPy is available.
+    """
+    return lex_logical_lines(logical_lines(source_text))
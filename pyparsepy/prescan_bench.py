@@ -0,0 +1,34 @@
+"""
+Compares prescan.logical_lines and prescan.lex, which use NumPy, with
+the pure Python versions in lex.  prescan_memory_bench.py checks the
+memory that prescan.logical_lines uses.
+
+    python prescan_bench.py [megabytes]
+"""
+
+import sys
+
+from bench import best_time
+import lex
+import prescan
+from parallel_bench import corpus
+
+REPEATS = 3
+
+
+def main(megabytes):
+    if prescan.numpy is None:
+        sys.exit('NumPy is not installed')
+    source_text = corpus(int(megabytes * (1 << 20)))
+    print('%d chars' % len(source_text))
+    print('scan_lines                 %.3fs' % best_time(
+        lambda: list(prescan.scan_lines(source_text)), REPEATS))
+    for name in ('logical_lines', 'lex'):
+        base = best_time(lambda: list(getattr(lex, name)(source_text)), REPEATS)
+        fast = best_time(lambda: list(getattr(prescan, name)(source_text)), REPEATS)
+        print('%-13s python %.3fs  numpy %.3fs  speedup %.2f' % (
+            name, base, fast, base / fast))
+
+
+if __name__ == '__main__':
+    main(float(sys.argv[1]) if len(sys.argv) > 1 else 4)
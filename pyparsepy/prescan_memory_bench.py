@@ -0,0 +1,53 @@
+"""
+Checks that the memory prescan.logical_lines uses at once does not grow
+with the size of the source text, since it scans a window of lines at a
+time.
+
+We measure the peak with tracemalloc while consuming the logical lines
+of corpora of 1MB to 8MB, and fail if the peak for the biggest is much
+more than for the smallest.
+
+    python prescan_memory_bench.py
+"""
+
+import gc
+import sys
+import tracemalloc
+import unittest
+
+import prescan
+from parallel_bench import corpus
+
+MEGABYTES = (1, 2, 4, 8)
+# A bounded peak gives a ratio of about 1, and a peak linear in the size
+# of the text a ratio of about MEGABYTES[-1] / MEGABYTES[0].
+MAX_RATIO = 1.5
+
+
+def peak_memory(source_text):
+    gc.collect()
+    tracemalloc.start()
+    try:
+        for _ in prescan.logical_lines(source_text):
+            pass
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak
+
+
+@unittest.skipIf(prescan.numpy is None, 'NumPy is not installed')
+class PrescanMemoryBench(unittest.TestCase):
+    def test_size_independent(self):
+        peaks = [peak_memory(corpus(megabytes << 20))
+                 for megabytes in MEGABYTES]
+        ratio = peaks[-1] / peaks[0]
+        sys.stderr.write('%s  ratio %4.1f\n' % (
+            '  '.join('%dMB %7.1fkB' % (megabytes, peak / 1024)
+                      for (megabytes, peak) in zip(MEGABYTES, peaks)),
+            ratio))
+        self.assertLess(ratio, MAX_RATIO)
+
+
+if __name__ == '__main__':
+    unittest.main()
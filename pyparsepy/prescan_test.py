@@ -0,0 +1,69 @@
+import random
+import unittest
+
+import lex
+import prescan
+
+SOURCES = (
+    '',
+    '\n',
+    'x',
+    'x = 1\ny = 2\n',
+    'f(a,\n  b)\ng(\n\ndef f():\n pass',
+    ')) x ((\n]\ny\n',
+    'x = """\n(\n"""\ny = (1 # )\n)\n',
+    'a = 1 + \\\n  2\nb\r\nc\rd\n',
+    'if x:\n\tf([1,\n\t  2])\nelse:\n    g({})\n',
+    's = "\udc00"\n\u00e9t\u00e9 = 1\n',
+)
+
+@unittest.skipIf(prescan.numpy is None, 'NumPy is not installed')
+class PrescanTest(unittest.TestCase):
+    def assert_same_as_lex(self, source_text):
+        self.assertEqual(
+            list(lex.logical_lines(source_text)),
+            list(prescan.logical_lines(source_text)))
+
+    def test_same_as_lex(self):
+        for source_text in SOURCES:
+            with self.subTest(source_text):
+                self.assert_same_as_lex(source_text)
+
+    def test_fuzz(self):
+        alphabet = ['x', ' ', '\t', '\n', '\r', '(', ')', '[', ']', '{', '}',
+                    '"', "'", '#', '\\', 'if', 'def', '1.e', ':']
+        rng = random.Random(0)
+        for _ in range(500):
+            source_text = ''.join(
+                rng.choice(alphabet) for _ in range(rng.randint(0, 40)))
+            with self.subTest(source_text):
+                self.assert_same_as_lex(source_text)
+
+    def test_scan_lines(self):
+        self.assertEqual(
+            [(0, 3, (1, 0)), (3, 7, None), (7, 13, (-1, -2))],
+            list(prescan.scan_lines('f(\n"x"\n) ) (\n')))
+
+    def test_scan_lines_in_small_windows(self):
+        for source_text in SOURCES + ('x\n' * 10, 'f(\n' + 'y' * 9 + ')'):
+            want = list(prescan.scan_lines(source_text))
+            for window in range(1, 6):
+                with self.subTest((source_text, window)):
+                    self.assertEqual(
+                        want,
+                        list(prescan.scan_lines(source_text, window)))
+
+
+class FallbackTest(unittest.TestCase):
+    def test_without_numpy(self):
+        numpy = prescan.numpy
+        prescan.numpy = None
+        try:
+            self.assertEqual(
+                ['x', '\n'],
+                [token.tok for token in prescan.lex('x')])
+        finally:
+            prescan.numpy = numpy
+
+if __name__ == '__main__':
+    unittest.main()
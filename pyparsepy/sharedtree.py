@@ -0,0 +1,296 @@
+"""
+Parse trees laid out flat in shared memory, so that worker processes can
+hand trees to their parent without pickling an object per node.
+
+A block holds a forest: a sequence of trees, each node before its
+children.  After a header of HEADER_FORMAT come columns of int64 with an
+entry per node:
+
+  op:
+    The index of an InnerNode's operator in CANONICAL_OPERATORS, or
+    TOKEN or SPECIAL_TOKEN for a leaf.
+  left, right:
+    The node's span, as in Token and InnerNode.
+  end:
+    The index just past the node's last descendant.  Its first child, if
+    any, is just after it, and each child's end is the next's index.
+  text_end:
+    The end of a token's UTF-8 text in the text blob that follows the
+    columns, where the previous token's text ends the one before.
+
+SharedTree reads nodes in place, and materializes InnerNodes and Tokens
+for all or part of the forest.
+"""
+
+from array import array
+from multiprocessing import resource_tracker, shared_memory
+import os
+import struct
+
+from lex import Token
+from ops import CANONICAL_OPERATORS, canonical_operator
+from parse import InnerNode
+
+FORMAT_VERSION = 1
+
+# version, node count, text blob size
+HEADER_FORMAT = 'qqq'
+HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
+
+COLUMNS = ('op', 'left', 'right', 'end', 'text_end')
+
+# Values of the op column for leaves.
+TOKEN = -1
+SPECIAL_TOKEN = -2
+
+OPERATOR_IDS = {id(op): i for (i, op) in enumerate(CANONICAL_OPERATORS)}
+
+def flatten(nodes):
+    """
+    Columns of the flat layout for the forest of nodes, as a dict from
+    each of COLUMNS to an array, and the text blob, as bytes.
+
+    Raises ValueError for an operator that is not predefined.
+    """
+    columns = {column: array('q') for column in COLUMNS}
+    ops = columns['op']
+    lefts = columns['left']
+    rights = columns['right']
+    ends = columns['end']
+    text_ends = columns['text_end']
+    texts = []
+    text_end = 0
+    # Pairs (index, iterator over children) for InnerNodes whose end is
+    # not yet known, below a pair for the roots.
+    stack = [(-1, iter(nodes))]
+    while stack:
+        parent_index, children = stack[-1]
+        for node in children:
+            index = len(ops)
+            lefts.append(node.left)
+            rights.append(node.right)
+            if isinstance(node, Token):
+                ops.append(SPECIAL_TOKEN if node.special else TOKEN)
+                text = node.tok.encode('utf-8', 'surrogatepass')
+                texts.append(text)
+                text_end += len(text)
+                text_ends.append(text_end)
+                ends.append(index + 1)
+                continue
+            op_id = OPERATOR_IDS.get(id(node.op))
+            if op_id is None or CANONICAL_OPERATORS[op_id] is not node.op:
+                raise ValueError('cannot share operator %r' % (node.op,))
+            ops.append(op_id)
+            text_ends.append(text_end)
+            ends.append(-1)
+            stack.append((index, iter(node.children)))
+            break
+        else:
+            stack.pop()
+            if parent_index >= 0:
+                ends[parent_index] = len(ops)
+    return columns, b''.join(texts)
+
+def write_shared(nodes):
+    """
+    The name of a new shared memory block holding the forest of nodes.
+
+    The caller, typically another process, must open it as a SharedTree
+    and unlink it once done, or pass the name to unlink_shared.  This
+    process does not track the block, so one that is never unlinked lasts
+    until reboot.
+    """
+    columns, text = flatten(nodes)
+    n_nodes = len(columns['op'])
+    size = HEADER_SIZE + 8 * n_nodes * len(COLUMNS) + len(text)
+    block = shared_memory.SharedMemory(create=True, size=max(1, size))
+    try:
+        buf = block.buf
+        struct.pack_into(
+            HEADER_FORMAT, buf, 0, FORMAT_VERSION, n_nodes, len(text))
+        offset = HEADER_SIZE
+        for column in COLUMNS:
+            data = columns[column].tobytes()
+            buf[offset:offset + len(data)] = data
+            offset += len(data)
+        buf[offset:offset + len(text)] = text
+        del buf
+        if os.name == 'posix':
+            # The reader unlinks the block, so this process's resource
+            # tracker must not unlink it too when this process exits.
+            resource_tracker.unregister(block._name, 'shared_memory')
+    finally:
+        block.close()
+    return block.name
+
+def unlink_shared(name):
+    """
+    Frees a block from write_shared that will not be read.
+    """
+    block = shared_memory.SharedMemory(name)
+    block.close()
+    block.unlink()
+
+class SharedTree:
+    """
+    A forest of parse trees in a shared memory block from write_shared.
+
+    Nodes are referred to by their index in the layout.  Use as a
+    context manager, or call close, and unlink when no process needs the
+    block any more.
+    """
+
+    def __init__(self, name):
+        self.block = shared_memory.SharedMemory(name)
+        try:
+            buf = self.block.buf
+            version, n_nodes, text_size = struct.unpack_from(
+                HEADER_FORMAT, buf)
+            if version != FORMAT_VERSION:
+                raise ValueError(
+                    'unsupported shared tree version: %r' % (version,))
+            self.n_nodes = n_nodes
+            self.views = []
+            offset = HEADER_SIZE
+            for column in COLUMNS:
+                size = 8 * n_nodes
+                view = buf[offset:offset + size].cast('q')
+                self.views.append(view)
+                setattr(self, column + 's', view)
+                offset += size
+            self.text = buf[offset:offset + text_size]
+            self.views.append(self.text)
+            del buf
+        except BaseException:
+            self.block.close()
+            raise
+
+    def __len__(self):
+        return self.n_nodes
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """
+        Releases this process's view of the block.  Nodes read from it
+        stay valid.
+        """
+        for view in self.views:
+            view.release()
+        self.views = []
+        self.block.close()
+
+    def unlink(self):
+        """
+        Frees the block once every process has closed it.
+        """
+        self.block.unlink()
+
+    def roots(self):
+        """
+        The indexes of the trees in the forest.
+        """
+        i = 0
+        ends = self.ends
+        while i < self.n_nodes:
+            yield i
+            i = ends[i]
+
+    def children(self, i):
+        """
+        The indexes of node i's children.
+        """
+        ends = self.ends
+        j = i + 1
+        end = ends[i]
+        while j < end:
+            yield j
+            j = ends[j]
+
+    def is_token(self, i):
+        return self.ops[i] < 0
+
+    def op(self, i):
+        """
+        The Operator of InnerNode i.
+        """
+        return canonical_operator(self.ops[i])
+
+    def tok(self, i):
+        """
+        The text of token i.
+        """
+        start = self.text_ends[i - 1] if i else 0
+        end = self.text_ends[i]
+        return str(self.text[start:end], 'utf-8', 'surrogatepass')
+
+    def node(self, i):
+        """
+        Materializes the subtree at index i as InnerNodes and Tokens.
+        """
+        return self.materialize(i, self.ends[i])[0]
+
+    def nodes(self, tokens=None):
+        """
+        Materializes the whole forest as a list of InnerNodes and Tokens.
+
+        tokens:
+          If given, the Tokens that were parsed, in order, which become
+          the leaves instead of Tokens made from the text blob.
+        """
+        return self.materialize(0, self.n_nodes, tokens)
+
+    def materialize(self, start, stop, tokens=None):
+        """
+        The materialized roots of the nodes from start up to stop, which
+        must together make up whole trees.
+        """
+        ops = self.ops[start:stop].tolist()
+        lefts = self.lefts[start:stop].tolist()
+        rights = self.rights[start:stop].tolist()
+        ends = self.ends[start:stop].tolist()
+        n = stop - start
+        built = [None] * n
+        if tokens is None:
+            text_ends = self.text_ends[start:stop].tolist()
+            text_start = self.text_ends[start - 1] if start else 0
+            text = self.text
+            for i in range(n):
+                if ops[i] < 0:
+                    text_end = text_ends[i]
+                    built[i] = Token(
+                        str(text[text_start:text_end], 'utf-8',
+                            'surrogatepass'),
+                        lefts[i], rights[i], ops[i] == SPECIAL_TOKEN)
+                    text_start = text_end
+        else:
+            tokens = iter(tokens)
+            for i in range(n):
+                if ops[i] < 0:
+                    built[i] = next(tokens)
+        # Children come after their parent, so build from the end.
+        for i in range(n - 1, -1, -1):
+            op = ops[i]
+            if op < 0:
+                continue
+            children = []
+            j = i + 1
+            end = ends[i] - start
+            while j < end:
+                children.append(built[j])
+                j = ends[j] - start
+            built[i] = InnerNode(
+                children, CANONICAL_OPERATORS[op], lefts[i], rights[i])
+        roots = []
+        i = 0
+        while i < n:
+            roots.append(built[i])
+            i = ends[i] - start
+        return roots
+
+    def __repr__(self):
+        return 'SharedTree(%r, nodes=%d)' % (self.block.name, self.n_nodes)
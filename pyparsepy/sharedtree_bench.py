@@ -0,0 +1,66 @@
+"""
+Compares returning parse trees from worker processes as shared memory
+blocks laid out by sharedtree.py with pickling InnerNodes and Tokens.
+
+First times just moving a tree, in one process: pickling and unpickling
+it, versus writing it to a block and reading it back, in place or
+materialized.  Then times parse_parallel end to end both ways.
+
+    python sharedtree_bench.py [megabytes]
+"""
+
+import pickle
+import sys
+
+from bench import best_time
+from lex import lex, preparse
+from parse import parse
+from parallel import parse_parallel, top_level_nodes
+from parallel_bench import corpus, started_executor, worker_counts
+from sharedtree import SharedTree, write_shared
+
+REPEATS = 3
+
+
+def read_shared(name, tokens=None, materialize=True):
+    with SharedTree(name) as tree:
+        tree.unlink()
+        if materialize:
+            return tree.nodes(tokens)
+        return sum(1 for _ in tree.roots())
+
+
+def main(megabytes):
+    source_text = corpus(int(megabytes * (1 << 20)))
+    tokens = list(preparse(lex(source_text)))
+    nodes = top_level_nodes(parse(tokens))
+    print('%d tokens, %d top-level nodes' % (len(tokens), len(nodes)))
+
+    pickle_time = best_time(lambda: pickle.loads(pickle.dumps(nodes)), REPEATS)
+    print('pickle                  %.3fs' % pickle_time)
+    for (label, f) in (
+            ('shared, in place', lambda: read_shared(
+                write_shared(nodes), materialize=False)),
+            ('shared, materialized', lambda: read_shared(
+                write_shared(nodes))),
+            ('shared, parent tokens', lambda: read_shared(
+                write_shared(nodes), tokens))):
+        elapsed = best_time(f, REPEATS)
+        print('%-23s %.3fs  speedup %.2f' % (
+            label, elapsed, pickle_time / elapsed))
+
+    base_time = best_time(lambda: parse(tokens), REPEATS)
+    print('parse                   %.3fs' % base_time)
+    for n_workers in worker_counts():
+        with started_executor(n_workers) as executor:
+            for shared_memory in (False, True):
+                elapsed = best_time(lambda: parse_parallel(
+                    tokens, executor, n_segments=max(2, n_workers),
+                    min_segment_size=1 << 12, shared_memory=shared_memory), REPEATS)
+                print('parse_parallel %2d workers, %-6s %.3fs  speedup %.2f' % (
+                    n_workers, 'shared' if shared_memory else 'pickle',
+                    elapsed, base_time / elapsed))
+
+
+if __name__ == '__main__':
+    main(float(sys.argv[1]) if len(sys.argv) > 1 else 1)
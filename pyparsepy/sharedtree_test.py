@@ -0,0 +1,89 @@
+import unittest
+
+from lex import Token, lex, preparse
+from ops import Operator, INFIX
+from parse import InnerNode, parse
+from parallel import top_level_nodes
+from parallel_test import describe
+from sharedtree import SharedTree, flatten, write_shared
+from traverse import events
+
+SOURCES = (
+    '',
+    'pass',
+    'if x:\n\tpass\nelse:\n\tf(a, [b, "\\u00e9\U0001f600"], {})\n',
+    'x = lambda: (yield)\ny = a is not b\n',
+)
+
+class SharedTreeTest(unittest.TestCase):
+    def shared(self, nodes):
+        tree = SharedTree(write_shared(nodes))
+        self.addCleanup(tree.unlink)
+        self.addCleanup(tree.close)
+        return tree
+
+    def test_round_trip(self):
+        for source_text in SOURCES:
+            with self.subTest(source_text):
+                tokens = list(preparse(lex(source_text)))
+                nodes = top_level_nodes(parse(tokens))
+                tree = self.shared(nodes)
+                want = [describe(node) for node in nodes]
+                self.assertEqual(want, [describe(n) for n in tree.nodes()])
+                got = tree.nodes(tokens)
+                self.assertEqual(want, [describe(n) for n in got])
+
+    def test_leaves_are_given_tokens(self):
+        tokens = list(preparse(lex('f(x)\n')))
+        tree = self.shared(top_level_nodes(parse(tokens)))
+        leaves = []
+        stack = tree.nodes(tokens)[::-1]
+        while stack:
+            node = stack.pop()
+            if isinstance(node, Token):
+                leaves.append(node)
+            else:
+                stack.extend(node.children[::-1])
+        self.assertEqual(len(tokens), len(leaves))
+        for (token, leaf) in zip(tokens, leaves):
+            self.assertIs(token, leaf)
+
+    def test_in_place(self):
+        tree = parse(preparse(lex('a + b\nc\n')))
+        shared = self.shared(top_level_nodes(tree))
+        roots = list(shared.roots())
+        self.assertEqual(2, len(roots))
+        statement = tree.children[0]
+        (plus, newline) = shared.children(roots[0])
+        self.assertFalse(shared.is_token(roots[0]))
+        self.assertIs(statement.op, shared.op(roots[0]))
+        self.assertTrue(shared.is_token(newline))
+        self.assertEqual('\n', shared.tok(newline))
+        self.assertEqual(
+            ['a', '+', 'b'],
+            [shared.tok(i) for i in range(plus, shared.ends[plus])
+             if shared.is_token(i)])
+        self.assertEqual(
+            (statement.children[0].left, statement.children[0].right),
+            (shared.lefts[plus], shared.rights[plus]))
+        self.assertEqual(
+            describe(statement.children[0]), describe(shared.node(plus)))
+
+    def test_deep(self):
+        source_text = '(' * 20000 + 'x' + ')' * 20000
+        tree = parse(preparse(lex(source_text)))
+        (got,) = self.shared([tree]).nodes()
+        describe_events = lambda tree: [
+            (event, node.tok if isinstance(node, Token) else node.op,
+             node.left, node.right)
+            for (event, node) in events(tree)]
+        self.assertEqual(describe_events(tree), describe_events(got))
+
+    def test_unknown_operator(self):
+        op = Operator('~~', INFIX, 1)
+        node = InnerNode([Token('~~', 0, 2)], op, 0, 2)
+        with self.assertRaises(ValueError):
+            flatten([node])
+
+if __name__ == '__main__':
+    unittest.main()
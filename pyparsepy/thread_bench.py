@@ -0,0 +1,43 @@
+"""
+Compares parse_many across thread counts with parsing one source after
+another, on copies of this package's own modules.
+
+    python thread_bench.py [copies]
+
+Threads only speed parsing up on a free-threaded build; with the GIL,
+this shows how much the pool costs.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+import glob
+import os
+import sys
+
+from bench import timed
+from parallel import parse_many, parse_source
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+THREAD_COUNTS = (1, 2, 4, 8, 16)
+
+
+def main(copies):
+    sources = []
+    for path in sorted(glob.glob(os.path.join(HERE, '*.py'))):
+        with open(path, encoding='utf-8') as inp:
+            sources.append(inp.read())
+    sources = sources * copies
+    is_gil_enabled = getattr(sys, '_is_gil_enabled', lambda: True)()
+    print('%d sources, %d chars, GIL %s, %d CPUs' % (
+        len(sources), sum(len(s) for s in sources),
+        'enabled' if is_gil_enabled else 'disabled', os.cpu_count() or 1))
+    base_time, _ = timed(lambda: [parse_source(s) for s in sources])
+    print('sequential  %.2fs' % base_time)
+    for n_threads in THREAD_COUNTS:
+        with ThreadPoolExecutor(n_threads) as executor:
+            elapsed, _ = timed(lambda: parse_many(sources, executor))
+        print('%2d threads  %.2fs  speedup %.2f' % (
+            n_threads, elapsed, base_time / elapsed))
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 4)
@@ -0,0 +1,57 @@
+"""
+Reports tokens per second for splitting physical lines into tokens with
+TOKEN_PATTERN, and with its alternatives in their natural order.
+
+    python token_bench.py [file.py ...]
+
+With no files, uses this package's own modules.
+"""
+
+import glob
+import os
+import re
+import sys
+
+from bench import best_time
+import lex as lexer
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+REPEATS = 10
+
+NATURAL_ORDER_TOKEN_PATTERN = re.compile(
+    '(?:%s)' % '|'.join((
+        lexer.NON_BREAKING_WHITESPACE,
+        lexer.BREAKING_WHITESPACE,
+        lexer.COMMENT,
+        lexer.STRING,
+        lexer.WORD,
+        lexer.NUMBER,
+        lexer.PUNCTUATION,
+        r'.',
+    )),
+    re.DOTALL)
+
+
+def main(paths):
+    phys_lines = []
+    for path in paths or sorted(glob.glob(os.path.join(HERE, '*.py'))):
+        with open(path, encoding='utf-8') as inp:
+            source_text = inp.read()
+        phys_lines.extend(
+            match.group(0) for match
+            in lexer.EXPLICIT_LINE_PATTERN.finditer(source_text))
+    n_tokens = sum(
+        len(lexer.TOKEN_PATTERN.findall(phys_line))
+        for phys_line in phys_lines)
+    print('%d physical lines, %d tokens' % (len(phys_lines), n_tokens))
+    for (name, pattern) in (
+            ('natural order', NATURAL_ORDER_TOKEN_PATTERN),
+            ('TOKEN_PATTERN', lexer.TOKEN_PATTERN)):
+        findall = pattern.findall
+        elapsed = best_time(
+            lambda: [findall(phys_line) for phys_line in phys_lines], REPEATS)
+        print('%-14s %10.0f tokens/s' % (name, n_tokens / elapsed))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
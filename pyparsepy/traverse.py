@@ -0,0 +1,82 @@
+"""
+Iterative traversal of parse trees, for trees too deep to recurse over.
+"""
+
+import json
+
+from lex import Token
+
+ENTER = 'ENTER'
+LEAVE = 'LEAVE'
+LEAF = 'LEAF'
+
+def events(tree):
+    """
+    Pairs (event, node) for a depth-first walk of tree: (ENTER, node)
+    before an InnerNode's children and (LEAVE, node) after them, and
+    (LEAF, token) for each Token.
+
+    Uses an explicit stack, so depth is limited only by memory.
+    """
+    if isinstance(tree, Token):
+        yield LEAF, tree
+        return
+    yield ENTER, tree
+    stack = [(tree, iter(tree.children))]
+    while stack:
+        node, children = stack[-1]
+        for child in children:
+            if not isinstance(child, Token):
+                yield ENTER, child
+                stack.append((child, iter(child.children)))
+                break
+            yield LEAF, child
+        else:
+            stack.pop()
+            yield LEAVE, node
+
+def pre_order(tree):
+    """
+    The InnerNodes and Tokens of tree, each before its children.
+    """
+    for (event, node) in events(tree):
+        if event is not LEAVE:
+            yield node
+
+def post_order(tree):
+    """
+    The InnerNodes and Tokens of tree, each after its children.
+    """
+    for (event, node) in events(tree):
+        if event is not ENTER:
+            yield node
+
+def write_json(tree, out, indent=None):
+    """
+    Writes tree to the file-like out as JSON, InnerNodes as arrays of
+    their children and Tokens as their text, a piece at a time.
+
+    The output is the same as json.dump with the given indent.
+    """
+    depth = 0
+    first = True
+    for (event, node) in events(tree):
+        if event is LEAVE:
+            depth -= 1
+            if not first and indent is not None:
+                out.write('\n' + ' ' * (indent * depth))
+            out.write(']')
+            first = False
+            continue
+        if depth:
+            if not first:
+                out.write(',' if indent is not None else ', ')
+            if indent is not None:
+                out.write('\n' + ' ' * (indent * depth))
+        if event is ENTER:
+            out.write('[')
+            depth += 1
+            first = True
+        else:
+            out.write(json.dumps(node.tok))
+            first = False
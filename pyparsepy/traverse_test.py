@@ -0,0 +1,79 @@
+import io
+import json
+import unittest
+
+from lex import Token, lex, preparse
+from parse import InnerNode, parse
+from parse_test import ParseTreeEncoder
+from traverse import events, pre_order, post_order, write_json, \
+    ENTER, LEAVE, LEAF
+
+SOURCES = (
+    '',
+    'pass',
+    'if x:\n\tpass\nelse:\n\tf(a, [b, "\\u00e9"], {})\n',
+    'x = lambda: (yield)\n',
+)
+
+def parse_source(source_text):
+    return parse(preparse(lex(source_text)))
+
+def describe(node):
+    return node.tok if isinstance(node, Token) else node.op.tok
+
+class TraverseTest(unittest.TestCase):
+    def test_events(self):
+        tree = parse_source('f(x)')
+        self.assertEqual(
+            [(event, describe(node)) for (event, node) in events(tree)],
+            [
+                (ENTER, '\n'),
+                (ENTER, '('),
+                (ENTER, None),
+                (LEAF, 'f'),
+                (LEAVE, None),
+                (LEAF, '('),
+                (ENTER, None),
+                (LEAF, 'x'),
+                (LEAVE, None),
+                (LEAF, ')'),
+                (LEAVE, '('),
+                (LEAF, '\n'),
+                (LEAVE, '\n'),
+            ])
+
+    def test_orders(self):
+        tree = parse_source('a + b')
+        self.assertEqual(
+            [describe(node) for node in pre_order(tree)],
+            ['\n', '+', None, 'a', '+', None, 'b', '\n'])
+        self.assertEqual(
+            [describe(node) for node in post_order(tree)],
+            ['a', None, '+', 'b', None, '+', '\n', '\n'])
+
+    def test_write_json(self):
+        for source_text in SOURCES:
+            tree = parse_source(source_text)
+            for indent in (None, 2):
+                with self.subTest(source_text=source_text, indent=indent):
+                    out = io.StringIO()
+                    write_json(tree, out, indent=indent)
+                    self.assertEqual(
+                        out.getvalue(),
+                        json.dumps(tree, cls=ParseTreeEncoder, indent=indent))
+
+    def test_deep(self):
+        depth = 100000
+        tree = parse_source('[' * depth + ']' * depth)
+        self.assertEqual(
+            sum(1 for node in pre_order(tree) if isinstance(node, InnerNode)),
+            depth + 1)
+        out = io.StringIO()
+        write_json(tree, out)
+        self.assertEqual(
+            out.getvalue(),
+            '[' + '["[", ' * depth + '"]"], ' * (depth - 1) + '"]"], "\\n"]')
+
+
+if __name__ == '__main__':
+    unittest.main()